@@ -0,0 +1,170 @@
+import contextlib
+import copy
+import contextvars
+import itertools
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import os
+
+CONTEXT_FIELDS = ("Gr", "COBOL", "cmd", "stage")
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+
+# {Gr, COBOL, cmd, stage} of the work in progress, added to every record by ContextFilter
+log_context = contextvars.ContextVar("log_context", default=dict())
+
+# AppLogger started by this process, see get_worker_args
+app_logger = None
+
+# extra of the per-hit debug records, only 1 of every sample_every is written
+SAMPLED = {"sampled": True}
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        context = log_context.get()
+        for field in CONTEXT_FIELDS:
+            if not hasattr(record, field):
+                setattr(record, field, context.get(field))
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, sample_every=1):
+        super().__init__()
+        self.sample_every = max(sample_every, 1)
+        self.counter = itertools.count()
+
+    def filter(self, record):
+        if self.sample_every == 1 or not getattr(record, "sampled", False):
+            return True
+        return next(self.counter) % self.sample_every == 0
+
+
+class RecordQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        """
+        the record put on the queue keeps its traceback apart from the message as exc_text,
+        QueueHandler.prepare merges it into the message and the JsonFormatter could not write it as exc_info
+        """
+        exc_text = record.exc_text
+        if record.exc_info:
+            exc_text = exc_text or logging.Formatter().formatException(record.exc_info)
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = exc_text
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {"time": self.formatTime(record), "level": record.levelname, "logger": record.name,
+                 "process": record.process, "message": record.getMessage()}
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class AppLogger:
+    def __init__(self, log_file="app.log", level="INFO", json_format=False, max_mb=100, backup_count=5,
+                 sample_every=1):
+        """
+        the records of every thread and pool worker are put on a queue, a background thread writes them
+        to log_file, which is rotated at max_mb, the log of the former run is kept as log_file.1
+        json_format: one JSON object per line with Gr, COBOL, cmd and stage of the record
+        sample_every: only 1 of every sample_every per-hit debug records (extra=SAMPLED) is written
+        """
+        self.log_file = log_file
+        self.level = logging.getLevelName(level.upper()) if isinstance(level, str) else level
+        if not isinstance(self.level, int):
+            raise ValueError(f"unknown log level: {level}")
+        self.json_format = json_format
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.backup_count = backup_count
+        self.sample_every = sample_every
+        self.queue = None
+        self.handler = None
+        self.listener = None
+
+    @staticmethod
+    def get_queue_handler(queue, sample_every):
+        handler = RecordQueueHandler(queue)
+        handler.addFilter(ContextFilter())
+        handler.addFilter(SamplingFilter(sample_every))
+        return handler
+
+    def start(self):
+        global app_logger
+        file_handler = logging.handlers.RotatingFileHandler(self.log_file, maxBytes=self.max_bytes,
+                                                            backupCount=self.backup_count, encoding='utf-8')
+        if self.backup_count and os.path.getsize(self.log_file):
+            file_handler.doRollover()
+        file_handler.setFormatter(JsonFormatter() if self.json_format else logging.Formatter(TEXT_FORMAT))
+        # a process queue, the pool workers put their records on it too
+        self.queue = multiprocessing.Queue(-1)
+        self.listener = logging.handlers.QueueListener(self.queue, file_handler)
+        self.listener.start()
+        self.handler = AppLogger.get_queue_handler(self.queue, self.sample_every)
+        root = logging.getLogger()
+        root.addHandler(self.handler)
+        root.setLevel(self.level)
+        app_logger = self
+        return self
+
+    def stop(self):
+        global app_logger
+        logging.getLogger().removeHandler(self.handler)
+        self.listener.stop()
+        for handler in self.listener.handlers:
+            handler.close()
+        self.queue.close()
+        app_logger = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        return False
+
+    @staticmethod
+    @contextlib.contextmanager
+    def context(**fields):
+        """add fields of CONTEXT_FIELDS to the records logged inside, in this thread"""
+        token = log_context.set({**log_context.get(), **fields})
+        try:
+            yield
+        finally:
+            log_context.reset(token)
+
+
+def get_worker_args(**fields):
+    """
+    fields: context of every record of the worker, ex. Gr
+    :return: arguments of init_worker_logging for the pool workers, None when no AppLogger is started
+    """
+    if app_logger is None:
+        return None
+    return app_logger.queue, app_logger.level, app_logger.sample_every, fields
+
+
+def init_worker_logging(queue, level, sample_every, fields):
+    """the records of a pool worker are put on the queue of the AppLogger of the main process"""
+    root = logging.getLogger()
+    # a forked worker inherits the handlers of the main process
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(AppLogger.get_queue_handler(queue, sample_every))
+    root.setLevel(level)
+    log_context.set(dict(fields))
@@ -7,21 +7,96 @@ Revision History:
     20240425 -
     1. Change the parameter passing method to reading external files
     2. Add basic logger and Error handler
+    20261018 -
+    1. Group input rows by member file, each member is read, preprocessed and indexed once for all of its commands
+    2. Add an LRU cache of preprocessed programs
+    3. Add the process pool mode (workers > 1), a failing member no longer aborts the run
+    4. Add the persistent result cache, only new or modified members are analyzed
+    5. The member index is saved in cache_dir and revalidated incrementally, duplicate members are reported
+    6. Output the recursive PERFORM cycles found by calc_loop_counts instead of the loop counts 99999
+    7. Stream results, not found and error rows to results.jsonl with checkpoints, add the resume mode,
+       results.xlsx and results.parquet are converted from the stream at the end
+    8. Replace the para module with a command line interface, which runs every combination of
+       groups and input types sharing one member index, one workbook load and one program cache
+    9. Time every stage of every member and write run_report.json with the slowest members,
+       add the opt-in cProfile / tracemalloc capture of the members over a threshold
+    10. Members are read through mmap, comment lines (* or / in col 7) and empty lines are dropped
+        in the same pass, the line No. in the file is kept for every line
+    11. Add the optional COPY expansion, copybooks are resolved in the member index of the group
+        and shared by every member through a size bounded cache
+    12. The serial mode reads the upcoming members with threads while the current one is analyzed
+    13. Add the pattern input type, the members are found by the token index of the libraries
+        instead of the cross reference workbook
+    14. The related sections are analyzed as views on the program lines instead of copies,
+        loop_lines gives the line No. in the member file of the hit deciding each loop
+    15. Log through a queue to a size rotated file, optionally as JSON records with Gr, COBOL, cmd and stage,
+        the per-hit debug records are sampled and the default level is INFO
 """
+import argparse
+import collections
+import concurrent.futures
+import functools
+import json
+import os
+import time
+from AppLogger import AppLogger, get_worker_args, LOG_LEVELS
 from FileManager import FileManager
-from LoopAnalyzer import LoopAnalyzer
-from SectionAnalyzer import SectionAnalyzer
+from MemberAnalyzer import analyze_member, init_copybook_cache, init_worker, ANALYZER_VERSION
+from Prefetcher import Prefetcher
+from ProgramCache import ProgramCache
+from ResultCache import ResultCache
+from ResultWriter import ResultWriter
+from RunReport import RunReport
+from TokenIndex import TokenIndex
+import pandas as pd
 import tqdm
-from para import params
 import logging
 
+logger = logging.getLogger(__name__)
+
 
 class Application:
-    def __init__(self, mapping_dict, input_file, input_type, Grp):
+    def __init__(self, mapping_dict, input_file, input_type, Grp, program_cache_size=128, workers=1,
+                 cache_dir=".analyze_cache", use_result_cache=True, output_dir=".", resume=False,
+                 excel=True, parquet=False, report=True, top_n=20, profile_seconds=None, profile_memory_mb=None,
+                 expand_copy=False, copybook_cache_lines=500000, prefetch_depth=8, prefetch_mb=64,
+                 pattern=None, file_manager=None, program_cache=None):
+        """
+        pattern: regular expression of the pattern input type, analyzed in every member containing it
+        prefetch_depth, prefetch_mb: members and MB read ahead by the serial mode, prefetch_depth=0 disables it
+        expand_copy: splice the copybooks after their COPY lines, so the sections, PERFORMs and GO TOs
+                     in copybooks are analyzed. the result cache is not used, it does not know the copybooks
+        copybook_cache_lines: size of the copybook cache of every process in lines
+        report: write output_dir/run_report.json with the stage timings of every member and the top_n slowest
+        profile_seconds, profile_memory_mb: members slower than profile_seconds are profiled with cProfile
+                                            to output_dir/profiles, the top allocations of members whose
+                                            peak memory is over profile_memory_mb are kept in the report
+        file_manager, program_cache: shared by the Applications of a batch run, created when not given
+        """
         logger.info("Initializing the Application.")
         try:
-            self.output_df = {"COBOL": [], "cmd": [], "parents_dict": [], "loop_dict": [], "loop_counts": []}
-            self.file_manager = FileManager(mapping_dict, input_file)
+            self.file_manager = file_manager or FileManager(mapping_dict, input_file, cache_dir)
+            self.program_cache = program_cache or ProgramCache(program_cache_size)
+            self.workers = workers
+            self.cache_dir = cache_dir
+            self.use_result_cache = use_result_cache
+            self.output_dir = output_dir
+            self.resume = resume
+            self.excel = excel
+            self.parquet = parquet
+            self.report = report
+            self.top_n = top_n
+            self.expand_copy = expand_copy
+            self.copybook_cache_lines = copybook_cache_lines
+            self.copybook_cache = None
+            self.prefetch_depth = prefetch_depth
+            self.prefetch_mb = prefetch_mb
+            self.pattern = pattern
+            self.profiler = None
+            if profile_seconds is not None or profile_memory_mb is not None:
+                self.profiler = {"profile_seconds": profile_seconds,
+                                 "memory_bytes": profile_memory_mb * 1024 * 1024 if profile_memory_mb else None,
+                                 "profile_dir": os.path.join(output_dir, "profiles")}
             self.type = input_type
             self.Grp = Grp
             self.input_type = input_type
@@ -31,55 +106,357 @@ class Application:
 
     def check_para(self):
         logger.info("Checking parameters.")
-        assert self.type in ["copy_book", "XDBMCR", "XDBREF"], "input type wrong!!"
+        assert self.type in ["copy_book", "XDBMCR", "XDBREF", "pattern"], "input type wrong!!"
+        assert self.type != "pattern" or self.pattern, "pattern is not given!!"
         logger.info("Parameters checked and validated.")
 
     def run(self):
-        logging.info("Application started")
+        logger.info("Application started")
+        writer = None
         try:
-            df = self.file_manager.read_data(Grp=self.Grp, input_type=self.input_type)
+            run_report = RunReport(self.top_n)
             self.file_manager.build_member_dict()
-            not_found_list = []
-            for index, row in tqdm.tqdm(df.iterrows(), total=df.shape[0]):
-                assert row["Gr"] and row["cmd"] and row["COBOL"], "Data structure error!!"
-                text = self.file_manager.get_file_content(row["Gr"], row["COBOL"])
-                if not text:
-                    not_found_list.append(f"Gr:{row['Gr']},file:{row['COBOL']}")
-                    continue
-                logger.info(f"Grp:{row['Gr']}, COBOL: {row['COBOL']}, cmd: {row['cmd']}")
-                # preprocess
-                text = FileManager.remove_comment_line(text)
-                text = FileManager.remove_empty_line(text)
-                logger.info("Data preprocessing completed successfully.")
-
-                sec_analyzer = SectionAnalyzer(text, row["cmd"])
-
-                # cursively extract the section containing the command and all its parent sections
-                sections, parents_dict = sec_analyzer.identify_all_rela_section()
-                # identify loops
-                loop_analyzer = LoopAnalyzer(sections, row["cmd"], parents_dict)
-                loop_analyzer.identify_all_loop(row["cmd"])
-                loop_counts = loop_analyzer.calc_loop_counts()
-                loop_dict = loop_analyzer.get_loop_dict()
-                self.collect_results(row, loop_dict, loop_counts, parents_dict)
-            FileManager.write_to_file(not_found_list, ".", "not_found_list.txt")
-            FileManager.write_to_excel(self.output_df, "results.xlsx")
+            if self.input_type == "pattern":
+                df = self.read_pattern_data()
+            else:
+                df = self.file_manager.read_data(Grp=self.Grp, input_type=self.input_type)
+            writer = ResultWriter(self.output_dir, resume=self.resume)
+            member_rows = self.group_by_member(df, writer, run_report)
+            if self.expand_copy and self.use_result_cache:
+                logger.info("The result cache is not used with the COPY expansion")
+            use_result_cache = self.use_result_cache and not self.expand_copy
+            result_cache = ResultCache(self.cache_dir, ANALYZER_VERSION) if use_result_cache else None
+            content_hashes = dict()
+            lookup = None
+            if result_cache:
+                lookup = functools.partial(self.lookup_result_cache, result_cache, writer, run_report, content_hashes)
+            if self.workers > 1:
+                if lookup:
+                    member_rows = self.lookup_members(member_rows, lookup)
+                analyzed = self.analyze_parallel(member_rows)
+            else:
+                analyzed = self.analyze_serial(member_rows, lookup)
+            # results are streamed as soon as a member is finished
+            error_counts = 0
+            for file_path, rows, member_results, stats in analyzed:
+                run_report.add_member(file_path, len(rows), stats)
+                start = time.perf_counter()
+                for (pos, row), result in zip(rows, member_results):
+                    self.collect_results(writer, pos, row, result)
+                    if "error" in result:
+                        error_counts += 1
+                    elif result_cache and file_path in content_hashes:
+                        result_cache.put(content_hashes[file_path], row["cmd"], result)
+                run_report.add_stage(file_path, "output", time.perf_counter() - start)
+            if result_cache:
+                print("result cache hits:", result_cache.hits, "misses:", result_cache.misses)
+                logger.info("Result cache hits: %d, misses: %d", result_cache.hits, result_cache.misses)
+                result_cache.close()
+            if error_counts:
+                logger.warning("%d commands failed, see the error records of %s", error_counts, writer.path)
+            logger.info("Program cache hits: %d, misses: %d", self.program_cache.hits, self.program_cache.misses)
+            if self.copybook_cache:
+                logger.info("Copybook cache hits: %d, misses: %d, COPY cycles: %d", self.copybook_cache.hits,
+                            self.copybook_cache.misses, len(self.copybook_cache.cycles))
+            self.file_manager.save_member_dict()
+            # only the group of this run, the other groups are reported by their own runs
+            for Gr, duplicates in self.file_manager.member_dict.get_duplicates([str(self.Grp)]).items():
+                for member_name, file_paths in duplicates.items():
+                    writer.write_duplicate_member(Gr, member_name, file_paths)
+            writer.close()
+            if self.excel:
+                writer.to_excel()
+            if self.parquet:
+                writer.to_parquet()
+            if self.report:
+                run_report.write(os.path.join(self.output_dir, "run_report.json"))
         except Exception as e:
-            logger.error("An error occurred during the Application run: {}".format(e), exc_info=True)
+            logger.error("An error occurred during the Application run: %s", e, exc_info=True)
+        finally:
+            if writer and not writer.file.closed:
+                writer.close()
+
+    def read_pattern_data(self):
+        """
+        the token index is updated for the new and modified members, and narrows the members to analyze
+        :return: DataFrame of Gr, COBOL, cmd like the workbook input types, and idxs: the line No. of the hits
+        """
+        token_index = TokenIndex(self.cache_dir, self.file_manager.member_dict)
+        try:
+            token_index.update([self.Grp])
+            hits = token_index.search(self.pattern, [self.Grp])
+        finally:
+            token_index.close()
+        df = pd.DataFrame([{"Gr": Gr, "COBOL": member_name, "cmd": self.pattern, "idxs": idxs}
+                           for Gr, member_name, file_path, idxs in hits], columns=["Gr", "COBOL", "cmd", "idxs"])
+        print("members matching the pattern:", df.shape[0])
+        return df
+
+    def lookup_result_cache(self, result_cache, writer, run_report, content_hashes, file_path, rows, data):
+        """
+        write the results of the rows answered by the cache, the member is hashed from its content already read
+        data: content of the member, None when it cannot be read: its rows are left to analyze without a hash,
+              they get their error record there and are not cached
+        :return: [(pos, row)] left to analyze
+        """
+        if data is None:
+            return rows
+        start = time.perf_counter()
+        content_hashes[file_path] = ResultCache.hash_data(data)
+        missing_rows = []
+        for pos, row in rows:
+            result = result_cache.get(content_hashes[file_path], row["cmd"])
+            if result is None:
+                missing_rows.append((pos, row))
+            else:
+                self.collect_results(writer, pos, row, result)
+        run_report.add_stage(file_path, "result_cache", time.perf_counter() - start)
+        return missing_rows
+
+    def lookup_members(self, member_rows, lookup):
+        """
+        the members are read by the threads of Prefetcher to be hashed, for the process pool mode
+        :return: {file_path: [(pos, row)]} left to analyze
+        """
+        missing_rows = collections.OrderedDict()
+        prefetcher = Prefetcher(max(self.prefetch_depth, 1), self.prefetch_mb * 1024 * 1024)
+        for file_path, data, error in prefetcher.prefetch(member_rows):
+            rows = lookup(file_path, member_rows[file_path], data)
+            if rows:
+                missing_rows[file_path] = rows
+        logger.info("%d of %d members need to be analyzed", len(missing_rows), len(member_rows))
+        return missing_rows
+
+    def analyze_serial(self, member_rows, lookup=None):
+        """
+        lookup: lookup_result_cache bound to the run, the rows answered by the cache are not analyzed.
+                every member is read once, the content read ahead is both hashed and analyzed
+        :return: generator of (file_path, [(pos, row)], [result], stats)
+        """
+        if self.expand_copy:
+            self.copybook_cache = init_copybook_cache(self.file_manager.member_dict, self.copybook_cache_lines)
+        # the members not in the program cache are read ahead in the same order, all of them to be hashed
+        prefetch_paths = set()
+        prefetched = iter(())
+        if self.prefetch_depth > 0:
+            prefetch_paths = {file_path for file_path, rows in member_rows.items()
+                              if lookup or not self.program_cache.contains(file_path, self.get_copy_group(rows))}
+            prefetcher = Prefetcher(self.prefetch_depth, self.prefetch_mb * 1024 * 1024)
+            prefetched = prefetcher.prefetch(file_path for file_path in member_rows if file_path in prefetch_paths)
+        for file_path, rows in tqdm.tqdm(member_rows.items(), total=len(member_rows)):
+            data, error = None, None
+            start = time.perf_counter()
+            if file_path in prefetch_paths:
+                _, data, error = next(prefetched)
+            elif lookup:
+                try:
+                    data = Prefetcher.read(file_path)
+                except OSError as e:
+                    logger.error("Failed to read member: %s", file_path, exc_info=True)
+                    error = e
+            wait = time.perf_counter() - start
+            if lookup:
+                rows = lookup(file_path, rows, data)
+                if not rows:
+                    continue
+            cmds = [row["cmd"] for pos, row in rows]
+            if error:
+                yield file_path, rows, [{"error": f"{type(error).__name__}: {error}"} for _ in cmds], dict()
+                continue
+            # read and preprocess the member once for all of its commands
+            member_results, stats = analyze_member(file_path, cmds, self.program_cache, self.profiler,
+                                                   self.get_copy_group(rows), data, self.get_hits(rows))
+            stats["stages"]["prefetch_wait"] = wait
+            yield file_path, rows, member_results, stats
+        if self.prefetch_depth > 0:
+            logger.info("Prefetched members ready: %d, waited for: %d", prefetcher.hits, prefetcher.waits)
+
+    def analyze_parallel(self, member_rows):
+        """
+        every member is a work unit of the process pool
+        :return: generator of (file_path, [(pos, row)], [result], stats) in order of completion
+        """
+        logger.info("Analyzing %d members with %d workers", len(member_rows), self.workers)
+        members = None
+        if self.expand_copy:
+            # every worker gets the members of the groups once and keeps its own copybook cache
+            groups = {self.get_copy_group(rows) for rows in member_rows.values()}
+            members = {Gr: dict(self.file_manager.member_dict[Gr]) for Gr in groups}
+        # the workers log through the queue of the AppLogger of this process
+        initargs = (get_worker_args(Gr=str(self.Grp)), members, self.copybook_cache_lines)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                                    initargs=initargs) as executor:
+            futures = {executor.submit(analyze_member, file_path, [row["cmd"] for pos, row in rows],
+                                       None, self.profiler, self.get_copy_group(rows), None,
+                                       self.get_hits(rows)): file_path
+                       for file_path, rows in member_rows.items()}
+            with tqdm.tqdm(total=sum(len(rows) for rows in member_rows.values())) as progress:
+                for future in concurrent.futures.as_completed(futures):
+                    file_path = futures[future]
+                    rows = member_rows[file_path]
+                    try:
+                        # the timings measured in the worker come back with the results
+                        member_results, stats = future.result()
+                    except Exception as e:
+                        # the worker itself died, ex. BrokenProcessPool
+                        logger.error("Work unit failed for %s", file_path, exc_info=True)
+                        member_results, stats = [{"error": f"{type(e).__name__}: {e}"} for _ in rows], dict()
+                    progress.update(len(rows))
+                    yield file_path, rows, member_results, stats
+
+    def get_copy_group(self, rows):
+        """:return: Gr to resolve the copybooks of a member in, None without the COPY expansion"""
+        if not self.expand_copy:
+            return None
+        pos, row = rows[0]
+        return str(row["Gr"])
+
+    def get_hits(self, rows):
+        """
+        :return: {cmd: [line No.]} found by the token index for the pattern input type, None = searched again.
+                 the line No. are of the member without its copybooks, so they are not given with the COPY expansion
+        """
+        if self.input_type != "pattern" or self.expand_copy:
+            return None
+        return {row["cmd"]: list(row["idxs"]) for pos, row in rows}
+
+    def group_by_member(self, df, writer, run_report):
+        """
+        rows not found are written, rows already written by the former run are skipped in resume mode
+        :return: {file_path: [(pos, row)]} in order of first appearance
+        """
+        member_rows = collections.OrderedDict()
+        skipped = 0
+        for pos, (index, row) in enumerate(df.iterrows()):
+            assert row["Gr"] and row["cmd"] and row["COBOL"], "Data structure error!!"
+            if writer.is_done(row):
+                skipped += 1
+                continue
+            start = time.perf_counter()
+            file_path = self.file_manager.get_file_path(row["Gr"], row["COBOL"])
+            # the not found members are reported by their name
+            run_report.add_stage(file_path or str(row["COBOL"]), "member_lookup", time.perf_counter() - start)
+            if not file_path:
+                writer.write_not_found(pos, row)
+                continue
+            member_rows.setdefault(file_path, []).append((pos, row))
+        if self.resume:
+            print("rows finished by the former run:", skipped)
+        return member_rows
+
+    def collect_results(self, writer, pos, row, result):
+        if "error" in result:
+            writer.write_error(pos, row, result["error"])
+            return
+        writer.write_result(pos, row,
+                            parents_dict=Application.format_parents_dict(result["parents_dict"]),
+                            loop_dict=result["loop_dict"],
+                            loop_counts=result["loop_counts"],
+                            cycles=result["cycles"],
+                            loop_lines=result["loop_lines"])
+
+    @staticmethod
+    def format_parents_dict(parents_dict):
+        """
+        sections and their parents are written in sorted order as JSON lists,
+        so the output does not depend on the hash seed of the process which analyzed the member
+        """
+        return {sec: sorted(parents) for sec, parents in sorted(parents_dict.items())}
+
+
+def run_batch(mapping_dict, input_file, groups, input_types, output_dir=".", cache_dir=".analyze_cache",
+              program_cache_size=128, **kwargs):
+    """
+    run every (group, input type), the outputs are written to output_dir/[input_type]_[Grp]
+    kwargs: the other parameters of Application
+    """
+    file_manager = FileManager(mapping_dict, input_file, cache_dir)
+    program_cache = ProgramCache(program_cache_size)
+    for input_type in input_types:
+        for Grp in groups:
+            logger.info("Batch run for group: %s and type: %s", Grp, input_type)
+            print(f"===== Gr:{Grp}, type:{input_type} =====")
+            app = Application(mapping_dict, input_file, input_type, Grp, cache_dir=cache_dir,
+                              output_dir=os.path.join(output_dir, f"{input_type}_{Grp}"),
+                              file_manager=file_manager, program_cache=program_cache, **kwargs)
+            # the records logged by the run carry its Gr
+            with AppLogger.context(Gr=str(Grp)):
+                app.run()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Identify the loop level containing the given commands in COBOL")
+    parser.add_argument("--mapping", required=True,
+                        help="JSON file of mapping_dict, {Gr: folder of the group's members}")
+    parser.add_argument("--input", help="the cross reference workbook, not needed by the pattern type")
+    parser.add_argument("--groups", nargs="+", required=True, help="Gr to analyze, ex. 1 5")
+    parser.add_argument("--types", nargs="+", default=["XDBMCR"],
+                        choices=["copy_book", "XDBMCR", "XDBREF", "pattern"], help="input types to analyze")
+    parser.add_argument("--pattern", help="regular expression analyzed in every member by the pattern type")
+    parser.add_argument("--output-dir", default=".", help="outputs are written to [output-dir]/[type]_[Gr]")
+    parser.add_argument("--cache-dir", default=".analyze_cache",
+                        help="member index, workbook sidecars and result cache")
+    parser.add_argument("--workers", type=int, default=1, help="number of processes, 1 = serial")
+    parser.add_argument("--program-cache-size", type=int, default=128,
+                        help="number of preprocessed programs kept in memory")
+    parser.add_argument("--resume", action="store_true", help="skip the rows written by the former run")
+    parser.add_argument("--no-result-cache", action="store_true", help="analyze every member again")
+    parser.add_argument("--no-excel", action="store_true", help="don't convert the results to results.xlsx")
+    parser.add_argument("--parquet", action="store_true", help="convert the results to results.parquet")
+    parser.add_argument("--expand-copy", action="store_true",
+                        help="analyze the copybooks spliced after their COPY lines, the result cache is not used")
+    parser.add_argument("--copybook-cache-lines", type=int, default=500000,
+                        help="lines of the expanded copybooks kept in memory by every process")
+    parser.add_argument("--prefetch-depth", type=int, default=8,
+                        help="members read ahead by threads in the serial mode, 0 = no prefetch")
+    parser.add_argument("--prefetch-mb", type=int, default=64, help="MB of the members read ahead")
+    parser.add_argument("--no-report", action="store_true", help="don't write run_report.json")
+    parser.add_argument("--top-n", type=int, default=20, help="number of the slowest members in run_report.json")
+    parser.add_argument("--profile-seconds", type=float,
+                        help="dump cProfile stats of the members slower than this to [output]/profiles")
+    parser.add_argument("--profile-memory-mb", type=float,
+                        help="trace memory and report the top allocations of the members whose peak is over this")
+    parser.add_argument("--log-file", default="app.log")
+    parser.add_argument("--log-level", default="INFO", type=str.upper, choices=LOG_LEVELS,
+                        help="DEBUG adds the per-hit records, sampled by --log-sample")
+    parser.add_argument("--log-json", action="store_true",
+                        help="write one JSON object per record with its Gr, COBOL, cmd and stage")
+    parser.add_argument("--log-max-mb", type=float, default=100, help="the log file is rotated at this size")
+    parser.add_argument("--log-backups", type=int, default=5, help="number of rotated log files kept")
+    parser.add_argument("--log-sample", type=int, default=100,
+                        help="write 1 of every N per-hit debug records, 1 = all of them")
+    args = parser.parse_args(argv)
+    if not args.input and set(args.types) - {"pattern"}:
+        parser.error("--input is required by the types " + ", ".join(sorted(set(args.types) - {"pattern"})))
+    if "pattern" in args.types and not args.pattern:
+        parser.error("--pattern is required by the pattern type")
+    return args
+
 
-    def collect_results(self, row, loop_dict, loop_counts, parents_dict):
-        self.output_df["COBOL"].append(row["COBOL"])
-        self.output_df["loop_dict"].append(str(loop_dict))
-        self.output_df["loop_counts"].append(loop_counts)
-        self.output_df["parents_dict"].append(str(parents_dict))
-        self.output_df["cmd"].append(row["cmd"])
+def main(argv=None):
+    args = parse_args(argv)
+    with open(args.mapping, 'r', encoding='utf-8') as f:
+        mapping_dict = {str(Gr): folder for Gr, folder in json.load(f).items()}
+    with AppLogger(args.log_file, args.log_level, args.log_json, args.log_max_mb, args.log_backups, args.log_sample):
+        run_batch(mapping_dict, args.input, args.groups, args.types,
+                  output_dir=args.output_dir,
+                  cache_dir=args.cache_dir,
+                  program_cache_size=args.program_cache_size,
+                  workers=args.workers,
+                  use_result_cache=not args.no_result_cache,
+                  resume=args.resume,
+                  excel=not args.no_excel,
+                  parquet=args.parquet,
+                  report=not args.no_report,
+                  top_n=args.top_n,
+                  expand_copy=args.expand_copy,
+                  copybook_cache_lines=args.copybook_cache_lines,
+                  prefetch_depth=args.prefetch_depth,
+                  prefetch_mb=args.prefetch_mb,
+                  pattern=args.pattern,
+                  profile_seconds=args.profile_seconds,
+                  profile_memory_mb=args.profile_memory_mb)
 
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.DEBUG,
-                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-                        filename='app.log',
-                        filemode='w')
-    logger = logging.getLogger(__name__)
-    app = Application(**params)
-    app.run()
+    main()
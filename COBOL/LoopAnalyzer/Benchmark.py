@@ -0,0 +1,157 @@
+"""
+Offline benchmark of the LoopAnalyzer pipeline on the synthetic corpus of CorpusGenerator.
+Every stage is timed for each program size and call-graph shape, so a regression of a hot path
+shows up as a bend of its scaling curve.
+
+python Benchmark.py --sizes 1000 5000 20000 --shapes 4x1 4x3 8x3 --repeat 3 --output bench.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from CorpusGenerator import CorpusGenerator
+from FileManager import FileManager
+from LoopAnalyzer import LoopAnalyzer
+from MemberIndex import MemberIndex
+from ProgramIndex import ProgramIndex
+from SectionAnalyzer import SectionAnalyzer
+import logging
+
+logger = logging.getLogger(__name__)
+
+STAGES = ["load_program", "program_index", "get_str_idxs",
+          "identify_all_rela_section", "identify_all_loop", "calc_loop_counts"]
+
+
+class Benchmark:
+    def __init__(self, work_dir, repeat=3, cmd="GET-NEXT", sections=40, cycles=0, seed=0):
+        self.work_dir = work_dir
+        self.repeat = repeat
+        self.cmd = cmd
+        self.sections = sections
+        self.cycles = cycles
+        self.seed = seed
+
+    @staticmethod
+    def timeit(func, repeat):
+        """
+        :return: best seconds of repeat calls, result of the last call
+        """
+        best = float("inf")
+        result = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - start)
+        return best, result
+
+    def run_case(self, lines, depth, fan_in):
+        """
+        time every stage of one member
+        :return: {"lines", "depth", "fan_in", "sections", stage: seconds}
+        """
+        generator = CorpusGenerator(lines=lines, sections=self.sections, depth=depth, fan_in=fan_in,
+                                    cycles=self.cycles, seed=self.seed)
+        path = os.path.join(self.work_dir, f"LIB%BENCH_{lines}_{depth}x{fan_in}.txt")
+        CorpusGenerator.write_member(path, generator.generate("BENCH"))
+
+        timings = dict()
+        timings["load_program"], (text, line_nos) = Benchmark.timeit(lambda: FileManager.load_program(path),
+                                                                     self.repeat)
+        timings["program_index"], index = Benchmark.timeit(lambda: ProgramIndex(text), self.repeat)
+        timings["get_str_idxs"], idxs = Benchmark.timeit(lambda: FileManager.get_str_idxs(text, self.cmd),
+                                                         self.repeat)
+
+        def identify_all_rela_section():
+            sec_analyzer = SectionAnalyzer(text, self.cmd, index)
+            return sec_analyzer.identify_all_rela_section(idxs)
+        timings["identify_all_rela_section"], (sections, parents_dict) = \
+            Benchmark.timeit(identify_all_rela_section, self.repeat)
+
+        def identify_all_loop():
+            loop_analyzer = LoopAnalyzer(sections, self.cmd, parents_dict, index)
+            loop_analyzer.identify_all_loop(self.cmd)
+            return loop_analyzer
+        timings["identify_all_loop"], loop_analyzer = Benchmark.timeit(identify_all_loop, self.repeat)
+        timings["calc_loop_counts"], loop_counts = Benchmark.timeit(loop_analyzer.calc_loop_counts, self.repeat)
+        timings["total"] = sum(timings[stage] for stage in STAGES)
+        return {"lines": len(text), "depth": depth, "fan_in": fan_in, "sections": len(index.sections),
+                "loop_counts": loop_counts, **timings}
+
+    def run_member_index(self, groups=1, programs=200):
+        """
+        time the member index of a generated library: cold walk, revalidation of the saved index
+        """
+        corpus_dir = os.path.join(self.work_dir, "corpus")
+        mapping_dict = CorpusGenerator(lines=50, sections=2, copies=1, seed=self.seed).write_corpus(
+            corpus_dir, groups=groups, programs=programs, workbook=False)
+        cache_dir = os.path.join(self.work_dir, "cache")
+
+        def cold():
+            if os.path.exists(os.path.join(cache_dir, "member_index.json")):
+                os.remove(os.path.join(cache_dir, "member_index.json"))
+            member_index = MemberIndex(mapping_dict, cache_dir)
+            member_index.load()
+            member_index.refresh()
+            member_index.save()
+
+        def warm():
+            member_index = MemberIndex(mapping_dict, cache_dir)
+            member_index.load()
+            member_index.refresh()
+        cold_seconds, _ = Benchmark.timeit(cold, self.repeat)
+        cold()
+        warm_seconds, _ = Benchmark.timeit(warm, self.repeat)
+        return {"members": groups * programs * 2, "cold": cold_seconds, "warm": warm_seconds}
+
+    def run(self, sizes, shapes):
+        """
+        shapes: [(depth, fan_in)]
+        :return: {"cases": [case], "member_index": {...}}
+        """
+        cases = []
+        for depth, fan_in in shapes:
+            for lines in sizes:
+                case = self.run_case(lines, depth, fan_in)
+                logger.info("Benchmark case: %s", case)
+                cases.append(case)
+        return {"cases": cases, "member_index": self.run_member_index()}
+
+    @staticmethod
+    def format_report(report):
+        columns = ["lines", "depth", "fan_in"] + STAGES + ["total"]
+        rows = [" ".join(f"{column[:12]:>12}" for column in columns)]
+        for case in report["cases"]:
+            rows.append(" ".join(f"{case[column]:>12}" if column in ("lines", "depth", "fan_in")
+                                 else f"{case[column] * 1000:>10.2f}ms" for column in columns))
+        member_index = report["member_index"]
+        rows.append(f"member index of {member_index['members']} files: cold {member_index['cold'] * 1000:.2f}ms, "
+                    f"warm {member_index['warm'] * 1000:.2f}ms")
+        return "\n".join(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the LoopAnalyzer pipeline on a synthetic corpus")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000], help="program line counts")
+    parser.add_argument("--shapes", nargs="+", default=["4x1", "4x3", "8x3"],
+                        help="call-graph shapes as [depth]x[fan_in]")
+    parser.add_argument("--sections", type=int, default=40)
+    parser.add_argument("--cycles", type=int, default=0, help="recursive PERFORMs per program")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args(argv)
+    shapes = [tuple(int(v) for v in shape.split("x")) for shape in args.shapes]
+    with tempfile.TemporaryDirectory() as work_dir:
+        benchmark = Benchmark(work_dir, repeat=args.repeat, sections=args.sections, cycles=args.cycles,
+                              seed=args.seed)
+        report = benchmark.run(args.sizes, shapes)
+    print(Benchmark.format_report(report))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
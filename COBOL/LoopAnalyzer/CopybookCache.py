@@ -0,0 +1,168 @@
+import bisect
+import collections
+import collections.abc
+import re
+from FileManager import FileManager
+from RunReport import StageTimer
+import logging
+
+logger = logging.getLogger(__name__)
+
+COPY_PATTERN = re.compile(r"\sCOPY\s+((?:\w|-)+)")
+
+
+class SplicedLines(collections.abc.Sequence):
+    """
+    Read-only lines of a program with copybooks spliced in, no line list is copied.
+    segments: [(lines, line_nos, source, begin, end)], the lines[begin:end] of every segment in order
+    source is the copybook name, None for the program itself
+    """
+    def __init__(self, segments):
+        self.segments = [segment for segment in segments if segment[4] > segment[3]]
+        self.starts = []
+        self.length = 0
+        for lines, line_nos, source, begin, end in self.segments:
+            self.starts.append(self.length)
+            self.length += end - begin
+
+    @staticmethod
+    def splice(lines, line_nos, source, inserts):
+        """
+        inserts: [(line No., SplicedLines)] in order of line No., each copybook follows its COPY line
+        """
+        segments = []
+        begin = 0
+        for No, copybook in inserts:
+            segments.append((lines, line_nos, source, begin, No + 1))
+            # the segments of nested copybooks are shared, not copied
+            segments.extend(copybook.segments)
+            begin = No + 1
+        segments.append((lines, line_nos, source, begin, len(lines)))
+        return SplicedLines(segments)
+
+    def __len__(self):
+        return self.length
+
+    def locate(self, idx):
+        """:return: segment containing idx, index in the lines of the segment"""
+        if idx < 0:
+            idx += self.length
+        if not 0 <= idx < self.length:
+            raise IndexError("SplicedLines index out of range")
+        pos = bisect.bisect_right(self.starts, idx) - 1
+        segment = self.segments[pos]
+        return segment, segment[3] + idx - self.starts[pos]
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(self.length)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            result = []
+            pos = bisect.bisect_right(self.starts, start) - 1
+            while start < stop and pos < len(self.segments):
+                lines, line_nos, source, begin, end = self.segments[pos]
+                offset = begin + start - self.starts[pos]
+                count = min(end - offset, stop - start)
+                result.extend(lines[offset:offset + count])
+                start += count
+                pos += 1
+            return result
+        (lines, line_nos, source, begin, end), i = self.locate(idx)
+        return lines[i]
+
+    def __iter__(self):
+        for lines, line_nos, source, begin, end in self.segments:
+            yield from map(lines.__getitem__, range(begin, end))
+
+    def get_origin(self, idx):
+        """:return: copybook name (None for the program), line No. in its file"""
+        (lines, line_nos, source, begin, end), i = self.locate(idx)
+        return source, line_nos[i] if line_nos is not None else i
+
+
+class CopybookCache:
+    def __init__(self, members, max_lines=500000):
+        """
+        copybooks expanded into programs, each one is read, preprocessed and expanded once
+        members: {Gr: {member_name: file_path}}, ex. FileManager.member_dict
+        max_lines: the least recently used copybooks are dropped over this total line count
+        nested COPY chains are memoized as the expanded copybook, a COPY cycle is reported and not expanded.
+        an expansion cut by a COPY cycle depends on the copybook the chain started from, so it is not memoized.
+        COPY ... REPLACING is spliced without replacing.
+        """
+        self.members = members
+        self.max_lines = max_lines
+        self.copybooks = collections.OrderedDict()
+        self.lines = 0
+        self.resolving = []
+        # the least index in resolving where a COPY cycle was cut, while the copybooks above it are expanded
+        self.cycle_start = None
+        self.cycles = []
+        self.hits = 0
+        self.misses = 0
+
+    def expand(self, Gr, lines, line_nos=None, source=None):
+        """
+        :return: SplicedLines with every copybook found in group Gr after its COPY line,
+                 lines itself when nothing is spliced
+        """
+        inserts = []
+        calls = 0
+        for No, line in enumerate(lines):
+            if "COPY" not in line:
+                continue
+            calls += 1
+            match = COPY_PATTERN.search(line)
+            if match:
+                copybook = self.get(Gr, match.group(1))
+                if copybook:
+                    inserts.append((No, copybook))
+        StageTimer.regex_calls += calls
+        if not inserts:
+            return lines
+        return SplicedLines.splice(lines, line_nos, source, inserts)
+
+    def get(self, Gr, name):
+        """:return: expanded copybook as SplicedLines, None when it is not found or in a COPY cycle"""
+        Gr = str(Gr)
+        file_path = self.members[Gr].get(name) if Gr in self.members else None
+        if not file_path:
+            logger.debug("Copybook not found: %s in group %s", name, Gr)
+            return None
+        if file_path in self.copybooks:
+            self.hits += 1
+            self.copybooks.move_to_end(file_path)
+            return self.copybooks[file_path]
+        if file_path in self.resolving:
+            start = self.resolving.index(file_path)
+            cycle = self.resolving[start:] + [file_path]
+            if cycle not in self.cycles:
+                logger.warning("COPY cycle is not expanded: %s", " -> ".join(cycle))
+                self.cycles.append(cycle)
+            self.cycle_start = start if self.cycle_start is None else min(self.cycle_start, start)
+            return None
+        self.misses += 1
+        depth = len(self.resolving)
+        outer_cycle_start = self.cycle_start
+        self.cycle_start = None
+        self.resolving.append(file_path)
+        try:
+            lines, line_nos = FileManager.load_program(file_path)
+            copybook = self.expand(Gr, lines, line_nos, name)
+        finally:
+            self.resolving.pop()
+            cycle_start = self.cycle_start
+            if outer_cycle_start is not None:
+                self.cycle_start = outer_cycle_start if cycle_start is None else min(cycle_start, outer_cycle_start)
+        if not isinstance(copybook, SplicedLines):
+            copybook = SplicedLines([(lines, line_nos, name, 0, len(lines))])
+        if cycle_start is not None and cycle_start <= depth:
+            # cut by a COPY cycle through this copybook or the ones it was copied from
+            return copybook
+        self.copybooks[file_path] = copybook
+        self.lines += len(copybook)
+        while self.lines > self.max_lines and len(self.copybooks) > 1:
+            _, dropped = self.copybooks.popitem(last=False)
+            self.lines -= len(dropped)
+        return copybook
@@ -0,0 +1,214 @@
+"""
+Synthetic fixed-format COBOL corpus for benchmarks, no confidential source library is needed.
+
+python CorpusGenerator.py --output-dir bench_corpus --groups 2 --programs 20 --lines 5000
+"""
+import argparse
+import json
+import os
+import random
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+XDBMCR_CMDS = ["GET-NEXT", "GET-XNXT", "GET-HNXT", "GET-INXT"]
+
+
+class CorpusGenerator:
+    def __init__(self, lines=2000, sections=20, depth=4, fan_in=2, goto_labels=2, perform_blocks=2, nesting=1,
+                 cycles=0, copies=2, cmd_ratio=0.05, seed=0):
+        """
+        lines: approximate line count of a program
+        sections: number of procedure SECTIONs including MAIN
+        depth, fan_in: the PERFORM graph has depth layers under MAIN, every section is performed by
+                       fan_in sections of the former layer (diamond shaped when fan_in > 1)
+        goto_labels: labels with a GO TO back-edge per section
+        perform_blocks: PERFORM ... UNTIL ... END-PERFORM blocks per section, nested up to nesting levels
+        cycles: number of recursive PERFORMs from a deep section back to a shallower one
+        copies: COPY clauses per program
+        cmd_ratio: ratio of the statements calling XDBMCR / XDBREF
+        """
+        self.lines = lines
+        self.sections = max(sections, 2)
+        self.depth = max(min(depth, self.sections - 1), 1)
+        self.fan_in = max(fan_in, 1)
+        self.goto_labels = goto_labels
+        self.perform_blocks = perform_blocks
+        self.nesting = max(nesting, 1)
+        self.cycles = cycles
+        self.copies = copies
+        self.cmd_ratio = cmd_ratio
+        self.random = random.Random(seed)
+
+    @staticmethod
+    def get_line(seq, text, program_id, area="B"):
+        """
+        sequence area (col 1-6), indicator area (col 7), area A (col 8) or B (col 12), identification area (col 73)
+        area="*" makes a comment line
+        """
+        body = {"A": " ", "B": "     ", "*": "*"}[area] + text
+        return f"{seq:06d}{body:<66.66}{program_id:<8}"
+
+    def get_statement(self, var_no):
+        if self.random.random() < self.cmd_ratio:
+            if self.random.random() < 0.8:
+                return f"CALL 'XDBMCR' USING {self.random.choice(XDBMCR_CMDS)} WK-AREA-{var_no}"
+            return f"CALL 'XDBREF' USING WK-KEY-{var_no}"
+        return f"MOVE WK-A-{var_no} TO WK-B-{var_no}"
+
+    def build_call_graph(self, names):
+        """
+        :return: {caller: [callee]} layered under MAIN, with fan_in callers per section and back-edges
+        """
+        layers = [[names[0]]]
+        rest = names[1:]
+        width = max(len(rest) // self.depth, 1)
+        for i in range(self.depth):
+            layer = rest[i * width:(i + 1) * width] if i < self.depth - 1 else rest[i * width:]
+            if layer:
+                layers.append(layer)
+        callees = {name: [] for name in names}
+        for upper, lower in zip(layers, layers[1:]):
+            for callee in lower:
+                for caller in self.random.sample(upper, min(self.fan_in, len(upper))):
+                    callees[caller].append(callee)
+        deep = [name for layer in layers[2:] for name in layer]
+        shallow = [name for layer in layers[1:-1] for name in layer]
+        for _ in range(self.cycles if deep and shallow else 0):
+            callees[self.random.choice(deep)].append(self.random.choice(shallow))
+        return callees
+
+    def generate(self, program_id, copybook_names=()):
+        """
+        :return: lines of one program
+        """
+        names = ["MAIN"] + [f"S{i:04d}-PROC" for i in range(1, self.sections)]
+        callees = self.build_call_graph(names)
+        copy_sections = [(self.random.choice(names[1:]), name) for name in copybook_names]
+        header = ["IDENTIFICATION DIVISION.", f"PROGRAM-ID. {program_id}.", "DATA DIVISION.",
+                  "WORKING-STORAGE SECTION.", "01 WK-EOF PIC 9."]
+        fixed = len(header) + 1 + sum(len(v) for v in callees.values()) + len(copy_sections) + \
+            self.sections * (4 + self.goto_labels * 5 + self.perform_blocks * (2 + 3 * self.nesting))
+        filler = max(self.lines - fixed, self.sections) // self.sections
+
+        body = [("A", line) for line in header]
+        body.append(("A", "PROCEDURE DIVISION."))
+        for no, name in enumerate(names):
+            # a unit is never split by a label, ex. a PERFORM ... END-PERFORM block
+            units = []
+            for _ in range(filler):
+                if self.random.random() < 0.05:
+                    units.append([("*", f"comment of {name}")])
+                else:
+                    units.append([("B", self.get_statement(no))])
+            for callee in callees[name]:
+                units.insert(self.random.randint(0, len(units)), [("B", f"PERFORM {callee}")])
+            for section_name, copybook_name in copy_sections:
+                if section_name == name:
+                    units.insert(self.random.randint(0, len(units)), [("B", f"COPY {copybook_name}.")])
+            for _ in range(self.perform_blocks):
+                block = [("B", self.get_statement(no)), ("B", "CALL 'XDBMCR' USING GET-NEXT WK-AREA")]
+                for level in range(self.random.randint(1, self.nesting)):
+                    block = [("B", f"PERFORM VARYING WK-I{level} FROM 1 BY 1"), ("B", f"  UNTIL WK-I{level} > 10")] \
+                        + block + [("B", "END-PERFORM")]
+                units.insert(self.random.randint(0, len(units)), block)
+            body.append(("A", f"{name} SECTION."))
+            body.append(("A", f"{name}-START."))
+            chunk = max(len(units) // (self.goto_labels + 1), 1)
+            for i in range(self.goto_labels + 1):
+                part = units[i * chunk:(i + 1) * chunk] if i < self.goto_labels else units[i * chunk:]
+                if i > 0:
+                    label = f"{name}-LOOP{i}"
+                    body.append(("A", f"{label}."))
+                body.extend(line for unit in part for line in unit)
+                if i > 0:
+                    body.extend([("B", "IF WK-EOF = 0"), ("B", f"  GO TO {label}"), ("B", "END-IF"),
+                                 ("B", "MOVE 0 TO WK-EOF.")])
+                elif not part:
+                    body.append(("B", self.get_statement(no)))
+            body.append(("A", f"{name}-EXIT."))
+            body.append(("B", "EXIT."))
+
+        lines = []
+        for seq, (area, text) in enumerate(body, start=1):
+            lines.append(CorpusGenerator.get_line(seq * 10, text, program_id, area))
+        return lines
+
+    @staticmethod
+    def generate_copybook(name):
+        return [CorpusGenerator.get_line(10, f"copybook {name}", name, "*"),
+                CorpusGenerator.get_line(20, f"MOVE SPACE TO {name}-AREA.", name)]
+
+    def write_corpus(self, output_dir, groups=2, programs=10, workbook=True):
+        """
+        write the members of every group to output_dir/src/[Gr], mapping.json and xref.xlsx
+        :return: mapping_dict
+        """
+        mapping_dict = dict()
+        xdbmcr_rows, xdbref_rows, copy_rows = [], [], []
+        for Gr in range(1, groups + 1):
+            Gr = str(Gr)
+            folder = os.path.join(output_dir, "src", Gr)
+            mapping_dict[Gr] = os.path.abspath(folder)
+            for no in range(programs):
+                program_id = f"PGM{no:05d}"
+                library = f"LIB{Gr}{no % 3}"
+                copybook_names = [f"CPY{no:03d}{i}" for i in range(self.copies)]
+                lines = self.generate(program_id, copybook_names)
+                # members are spread over library subfolders like the real source libraries
+                CorpusGenerator.write_member(os.path.join(folder, library, f"{library}%{program_id}.txt"), lines)
+                for name in copybook_names:
+                    CorpusGenerator.write_member(os.path.join(folder, "COPYLIB", f"COPYLIB%{name}.txt"),
+                                                 CorpusGenerator.generate_copybook(name))
+                    copy_rows.append({"Gr": Gr, "COPY句": name, "COBOL": f"{library}%{program_id}"})
+                text = "\n".join(lines)
+                for cmd in XDBMCR_CMDS:
+                    if cmd in text:
+                        xdbmcr_rows.append({"Gr": Gr, "COBOL": f"{library}%{program_id}", "命令": cmd})
+                if "'XDBREF'" in text:
+                    xdbref_rows.append({"Gr": Gr, "COBOL": f"{library}%{program_id}"})
+        with open(os.path.join(output_dir, "mapping.json"), 'w', encoding='utf-8') as f:
+            json.dump(mapping_dict, f, indent=2)
+        if workbook:
+            with pd.ExcelWriter(os.path.join(output_dir, "xref.xlsx")) as writer:
+                pd.DataFrame(xdbmcr_rows, columns=["Gr", "COBOL", "命令"]).to_excel(writer, sheet_name="XDBMCR")
+                pd.DataFrame(xdbref_rows, columns=["Gr", "COBOL"]).to_excel(writer, sheet_name="XDBREF（COBOL）")
+                pd.DataFrame(copy_rows, columns=["Gr", "COPY句", "COBOL"]).to_excel(writer, sheet_name="COPY句_COBOL")
+        logger.info("Corpus written to %s: %d groups, %d programs per group", output_dir, groups, programs)
+        return mapping_dict
+
+    @staticmethod
+    def write_member(path, lines):
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w', encoding='SJIS', newline="") as f:
+            f.write("\r\n".join(lines) + "\r\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic COBOL corpus")
+    parser.add_argument("--output-dir", required=True)
+    parser.add_argument("--groups", type=int, default=2)
+    parser.add_argument("--programs", type=int, default=10, help="programs per group")
+    parser.add_argument("--lines", type=int, default=2000)
+    parser.add_argument("--sections", type=int, default=20)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--fan-in", type=int, default=2)
+    parser.add_argument("--goto-labels", type=int, default=2)
+    parser.add_argument("--perform-blocks", type=int, default=2)
+    parser.add_argument("--nesting", type=int, default=1)
+    parser.add_argument("--cycles", type=int, default=0)
+    parser.add_argument("--copies", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-workbook", action="store_true", help="don't write xref.xlsx (needs openpyxl)")
+    args = parser.parse_args(argv)
+    generator = CorpusGenerator(lines=args.lines, sections=args.sections, depth=args.depth, fan_in=args.fan_in,
+                                goto_labels=args.goto_labels, perform_blocks=args.perform_blocks,
+                                nesting=args.nesting, cycles=args.cycles, copies=args.copies, seed=args.seed)
+    generator.write_corpus(args.output_dir, groups=args.groups, programs=args.programs,
+                           workbook=not args.no_workbook)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,56 @@
+import array
+import hashlib
+import io
+import mmap
 import os
 import re
 import pandas as pd
 import logging
+from MemberIndex import MemberIndex
+from RunReport import StageTimer
 
 
 logger = logging.getLogger(__name__)
 
+# indicator area (col 7) of a comment line, * or / (comment with page eject)
+COMMENT_INDICATORS = (b"*", b"/")
+
 
 class FileManager:
-    def __init__(self, mapping_dict, input_file):
+    def __init__(self, mapping_dict, input_file, cache_dir=".analyze_cache"):
         """
         mapping_dict: {key1: {key2: value}}
         key1 = Grp, key2=member_name, value=file_name
         """
         self.mapping_dict = mapping_dict
-        self.member_dict = {grp: dict() for grp in mapping_dict.keys()}
+        self.member_dict = MemberIndex(mapping_dict, cache_dir)
         self.input_file = input_file
+        self.cache_dir = cache_dir
+        self.sheets = dict()
+        self.member_dict_loaded = False
         logger.info("FileManager initialized successfully")
 
-    def build_member_dict(self):
+    def build_member_dict(self, eager=False):
         """
         データ断面が異なることにより、ライブラリ名を参照せず、メンバー名を基準とする
         member_dict = {[Gr]:{[member_name]:[file_name]}
+        the index saved by the former run is loaded, each group is revalidated on its first lookup
+        and only directories whose mtime changed are walked again. eager=True validates every group now.
         """
         logger.info("Building member dictionary")
-        for key, folder in self.mapping_dict.items():
-            for root, dirs, files in os.walk(folder):
-                for filename in files:
-                    parts = filename.split('%')
-                    if parts:
-                        member_name = parts[-1].replace(".txt", "").replace(".cob", "")
-                        self.member_dict[key][member_name] = os.path.join(root, filename)
+        # already loaded by a former run of the same batch
+        if not self.member_dict_loaded:
+            self.member_dict.load()
+            self.member_dict_loaded = True
+        if eager:
+            self.member_dict.refresh()
         logger.info("Member dictionary built successfully")
 
+    def save_member_dict(self):
+        self.member_dict.save()
+        for Gr, duplicates in self.member_dict.get_duplicates().items():
+            logger.warning("%d duplicate member names in group %s", len(duplicates), Gr)
+
     def read_data(self, Grp, input_type):
         logger.info("Reading data for group: %s and type: %s", Grp, input_type)
         try:
@@ -47,9 +65,55 @@ class FileManager:
         except Exception as e:
             logger.error("Failed to read data for %s and %s", Grp, input_type, exc_info=True)
 
+    def read_sheet(self, sheet_name, usecols):
+        """
+        read only usecols of the sheet. the columns are converted once to a pickled sidecar
+        keyed by the workbook path, mtime and size, later runs load the sidecar instead of parsing the workbook.
+        a sidecar which cannot be loaded is removed and the workbook is read again.
+        the frame is also kept in memory for the other groups and input types of the same run, don't modify it
+        """
+        stat = os.stat(self.input_file)
+        key = "|".join([os.path.abspath(self.input_file), str(stat.st_mtime_ns), str(stat.st_size),
+                        sheet_name, ",".join(usecols)])
+        if key in self.sheets:
+            return self.sheets[key]
+        # the sidecars of a sheet share the prefix, the ones of former versions of the workbook are removed
+        prefix = hashlib.sha1("|".join([os.path.abspath(self.input_file), sheet_name, ",".join(usecols)])
+                              .encode('utf-8')).hexdigest()
+        sidecar_path = os.path.join(self.cache_dir, "workbook", f"{prefix}-{stat.st_mtime_ns}-{stat.st_size}.pkl")
+        df = None
+        if os.path.exists(sidecar_path):
+            logger.info("Loading sheet %s from sidecar %s", sheet_name, sidecar_path)
+            try:
+                df = pd.read_pickle(sidecar_path)
+            except Exception:
+                logger.warning("Failed to load sidecar %s, the workbook is read again", sidecar_path, exc_info=True)
+                os.remove(sidecar_path)
+        if df is None:
+            logger.info("Reading sheet %s from %s", sheet_name, self.input_file)
+            df = pd.read_excel(self.input_file, sheet_name=sheet_name, usecols=usecols)
+            FileManager.write_sidecar(df, sidecar_path, prefix)
+        self.sheets[key] = df
+        return df
+
+    @staticmethod
+    def write_sidecar(df, sidecar_path, prefix):
+        """the sidecar is written to a temporary file first, an interrupted run leaves no truncated sidecar"""
+        folder_path = os.path.dirname(sidecar_path)
+        if not os.path.exists(folder_path):
+            os.makedirs(folder_path)
+        tmp_path = sidecar_path + ".tmp"
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, sidecar_path)
+        for file_name in os.listdir(folder_path):
+            file_path = os.path.join(folder_path, file_name)
+            if file_name.startswith(prefix + "-") and file_path != sidecar_path:
+                logger.info("Removing the sidecar of a former workbook: %s", file_path)
+                os.remove(file_path)
+
     def read_XDBMCR_data(self, Grp):
         Grp = str(Grp)
-        df = pd.read_excel(self.input_file, sheet_name="XDBMCR")
+        df = self.read_sheet("XDBMCR", ["Gr", "COBOL", "命令"])
         df = df.rename({"命令": "cmd"}, axis=1)
         df = df[["Gr", "COBOL", "cmd"]]
         # filter grp
@@ -63,7 +127,7 @@ class FileManager:
 
     def read_XDBREF_data(self, Grp):
         Grp = str(Grp)
-        df = pd.read_excel(self.input_file, usecols=["Gr", "COBOL"], sheet_name="XDBREF（COBOL）")
+        df = self.read_sheet("XDBREF（COBOL）", ["Gr", "COBOL"])
         # filter grp
         df = df[df["Gr"].astype(str).str.contains(Grp)]
         print("data size before remove duplicate:", df.shape[0])
@@ -74,7 +138,7 @@ class FileManager:
 
     def read_COPY_book(self, Grp):
         Grp = str(Grp)
-        df = pd.read_excel(self.input_file, sheet_name="COPY句_COBOL")
+        df = self.read_sheet("COPY句_COBOL", ["Gr", "COPY句", "COBOL"])
         df = df[["Gr", "COPY句", "COBOL"]]
         # filter grp
         df = df[df["Gr"].astype(str).str.contains(Grp)]
@@ -85,15 +149,71 @@ class FileManager:
         print("data size after remove duplicate:", df.shape[0])
         return df
 
-    def get_file_content(self, Gr, COBOL):
+    def get_file_path(self, Gr, COBOL):
         member_name = COBOL.split("%")[-1].replace(".txt", "")
         Gr = str(Gr)
         assert Gr in self.member_dict.keys()
-        if member_name in self.member_dict[Gr].keys():
-            file_path = self.member_dict[Gr][member_name]
+        return self.member_dict[Gr].get(member_name)
+
+    def get_file_content(self, Gr, COBOL):
+        file_path = self.get_file_path(Gr, COBOL)
+        if file_path:
             return FileManager.read_file(file_path)
         return None
 
+    @staticmethod
+    def load_program(path, timer=None, data=None):
+        """
+        read a member and drop its comment and empty lines in one pass over the memory-mapped file,
+        comment lines are told by the indicator area and are never decoded
+        timer: StageTimer of the member
+        data: content of the file already read, ex. by Prefetcher
+        :return: lines, array of their line No. in the file
+        """
+        timer = timer or StageTimer()
+        if data is not None:
+            with timer.stage("load_program"):
+                return FileManager.parse_program(io.BytesIO(data))
+        assert os.path.exists(path), f"{path} not exist!!"
+        with timer.stage("load_program"), open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return [], array.array("I")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return FileManager.parse_program(data)
+
+    @staticmethod
+    def parse_program(data):
+        """
+        data: SJIS content with readline(), ex. mmap
+        :return: lines which are not comment or empty, array of their line No. in the file
+        """
+        lines = []
+        line_nos = array.array("I")
+        for No, raw in enumerate(FileManager.split_lines(data)):
+            if raw[:6].isascii():
+                if raw[6:7] in COMMENT_INDICATORS:
+                    continue
+                # SJIS is ASCII below 0x80, the ASCII decoder is much faster
+                line = raw.decode('ascii') if raw.isascii() else raw.decode('SJIS', errors="ignore")
+            else:
+                # double byte characters in the sequence area, count the columns after decoding
+                line = raw.decode('SJIS', errors="ignore")
+                if line[6:7] in ("*", "/"):
+                    continue
+            if line.strip():
+                lines.append(line)
+                line_nos.append(No)
+        return lines, line_nos
+
+    @staticmethod
+    def split_lines(data):
+        """lines of the mapped file without line breaks, a lone CR also ends a line like the universal newlines"""
+        for chunk in iter(data.readline, b""):
+            if b"\r" in chunk:
+                yield from chunk.splitlines()
+            else:
+                yield chunk.rstrip(b"\n")
+
     @staticmethod
     def remove_comment_line(lines):
         new_lines = []
@@ -132,4 +252,134 @@ class FileManager:
 
     @staticmethod
     def get_str_idxs(text, str):
-        return [No for No, line in enumerate(text) if re.search(str, line)]
\ No newline at end of file
+        pattern = re.compile(str)
+        StageTimer.regex_calls += len(text)
+        return [No for No, line in enumerate(text) if pattern.search(line)]
+
+    @staticmethod
+    def get_str_idxs_multi(text, patterns):
+        """
+        search many patterns in one pass over the lines
+        a line is only matched against the regexes whose literal parts it contains,
+        and a combined alternation of those literals skips the lines that contain none of them
+        :return: {pattern: [line No.]}
+        """
+        patterns = list(dict.fromkeys(patterns))
+        hits = {pattern: [] for pattern in patterns}
+        searchers = []
+        always = []
+        for pattern in patterns:
+            literals = FileManager.get_literals(pattern)
+            if literals:
+                searchers.append((pattern, re.compile(pattern), literals))
+            else:
+                always.append((pattern, re.compile(pattern)))
+        anchors = {max(literals, key=len) for _, _, literals in searchers}
+        prefilter = re.compile("|".join(map(re.escape, sorted(anchors)))) if anchors else None
+        calls = len(text) * (len(always) + (prefilter is not None))
+        for No, line in enumerate(text):
+            for pattern, regex in always:
+                if regex.search(line):
+                    hits[pattern].append(No)
+            if prefilter is None or not prefilter.search(line):
+                continue
+            for pattern, regex, literals in searchers:
+                if all(literal in line for literal in literals):
+                    calls += 1
+                    if regex.search(line):
+                        hits[pattern].append(No)
+        StageTimer.regex_calls += calls
+        return hits
+
+    @staticmethod
+    def get_literals(pattern):
+        """
+        literal strings which every match of the pattern contains, ex. \\sCOPY\\s+ABC\\.?\\s -> ["COPY", "ABC"]
+        groups, classes and optional characters are skipped, [] when the pattern is too complex to tell
+        """
+        if "|" in pattern or "(?" in pattern:
+            return []
+        literals = []
+        cur = ""
+        i = 0
+        while i < len(pattern):
+            c = pattern[i]
+            if c == "\\" and pattern[i + 1:i + 2] in tuple("xuUN0123456789"):
+                # escaped code point or back reference
+                return []
+            if c == "\\" and i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+                # escaped meta character, ex. \\.
+                cur += pattern[i + 1]
+                i += 2
+            elif c == "\\" or c in ".^$":
+                # character class like \\s, any character or anchor
+                literals.append(cur)
+                cur = ""
+                i += 2 if c == "\\" else 1
+            elif c in "*?{":
+                # the former character may not appear
+                literals.append(cur[:-1])
+                cur = ""
+                i = pattern.find("}", i) + 1 if c == "{" else i + 1
+                if i == 0:
+                    return []
+            elif c == "+":
+                literals.append(cur)
+                cur = ""
+                i += 1
+            elif c in "([":
+                literals.append(cur)
+                cur = ""
+                end = FileManager.skip_group(pattern, i)
+                if end < 0:
+                    return []
+                i = end
+                # an optional group or class
+                if i < len(pattern) and pattern[i] in "*?{+":
+                    i = pattern.find("}", i) + 1 if pattern[i] == "{" else i + 1
+                    if i == 0:
+                        return []
+            else:
+                cur += c
+                i += 1
+        literals.append(cur)
+        return [literal for literal in literals if literal]
+
+    @staticmethod
+    def skip_group(pattern, i):
+        """:return: index just after the group or class starting at i, -1 when it is not closed"""
+        if pattern[i] == "[":
+            i += 1
+            # "]" right after "[" or "[^" is a member of the class, not its end
+            if pattern[i:i + 1] == "^":
+                i += 1
+            if pattern[i:i + 1] == "]":
+                i += 1
+            while i < len(pattern):
+                if pattern[i] == "\\":
+                    i += 2
+                    continue
+                if pattern[i] == "]":
+                    return i + 1
+                i += 1
+            return -1
+        depth = 0
+        while i < len(pattern):
+            c = pattern[i]
+            if c == "\\":
+                i += 2
+                continue
+            if c == "[":
+                # a ")" inside a class does not close the group
+                i = FileManager.skip_group(pattern, i)
+                if i < 0:
+                    return -1
+                continue
+            if c == "(":
+                depth += 1
+            elif c == ")":
+                if depth == 1:
+                    return i + 1
+                depth -= 1
+            i += 1
+        return -1
\ No newline at end of file
@@ -1,53 +1,123 @@
-import collections
-import os
-import re
-import copy
-import sys
 from FileManager import FileManager
-from SectionAnalyzer import SectionAnalyzer
+from ProgramIndex import ProgramIndex
+from LoopSpanIndex import LoopSpanIndex
+from SectionView import SectionView
 import logging
 
 logger = logging.getLogger(__name__)
 
 
 class LoopAnalyzer:
-    def __init__(self, text, cmd, parents_dict):
-        self.text = text
+    def __init__(self, text, cmd, parents_dict, index=None):
+        """
+        text: lines to analyze, or a SectionView of the related sections returned by SectionAnalyzer
+        index: ProgramIndex of the program lines under the view, shared with SectionAnalyzer
+        the line No. given and recorded are those of the program, the loops are searched inside the view
+        """
+        self.text = text if isinstance(text, SectionView) else SectionView(text)
+        self.index = index if index is not None else ProgramIndex(self.text.text)
         self.cmd = cmd
         self.parents_dict = parents_dict
         self.loop_dict = dict()
+        self.cycles = []
+        self.expanded = set()
+        # {section_name: line No. of the hit deciding its loop value}
+        self.loop_idxs = dict()
+        self.spans = None
 
     def get_loop_dict(self):
         return self.loop_dict
 
+    def get_loop_idxs(self):
+        return self.loop_idxs
+
+    def get_spans(self):
+        """
+        :return: LoopSpanIndex of the view, built on the first hit so that every hit is classified by bisect
+        """
+        if self.spans is None:
+            self.spans = LoopSpanIndex(self.text, self.index)
+        return self.spans
+
+    def get_cycles(self):
+        """
+        :return: [[section_name]] sections performing each other recursively, found by calc_loop_counts
+        """
+        return self.cycles
+
     def calc_loop_counts(self):
-        def find_max_sec_sum(sec, cur_sum):
-            nonlocal max_v, sec_val_dict
-            cur_sum += sec_val_dict[sec]
-            if cur_sum > 30:
-                logger.debug("infinite recursion found for section: %s", sec)
-                max_v = 99999
-                return
-            if not self.parents_dict[sec]:
-                max_v = max(max_v, cur_sum)
-            else:
-                for parent in self.parents_dict[sec]:
-                    find_max_sec_sum(parent, cur_sum)
-
-        logger.info("Starting to calculate loop counts.")
+        """
+        max sum of loop values on a route from a section in loop_dict up to a section without parents.
+        every strongly connected component of the parents graph is counted once with the sum of its values,
+        so a recursive PERFORM cycle does not make the route infinite, the cycles are reported by get_cycles.
+        linear in sections + edges: Tarjan's algorithm emits a component after all of its parents,
+        the best route of a component is decided when it is emitted.
+        """
+        logger.debug("Starting to calculate loop counts.")
         try:
             sec_val_dict = {}
             for sec, str_value in self.loop_dict.items():
                 sec_val_dict[sec] = self.get_loop_value(str_value)
-            # calc every section's value including its parents
-            max_v = -1
-            for sec in sec_val_dict:
-                find_max_sec_sum(sec, cur_sum=0)
+            self.cycles = []
+            best = dict()
+            order = dict()
+            low = dict()
+            stack = []
+            on_stack = set()
+            for root in sec_val_dict:
+                if root in order:
+                    continue
+                # iterative Tarjan, work = [(section, iterator of its parents)]
+                work = [(root, iter(self.parents_dict.get(root, ())))]
+                order[root] = low[root] = len(order)
+                stack.append(root)
+                on_stack.add(root)
+                while work:
+                    sec, parents = work[-1]
+                    parent = next(parents, None)
+                    if parent is not None:
+                        if parent not in order:
+                            order[parent] = low[parent] = len(order)
+                            stack.append(parent)
+                            on_stack.add(parent)
+                            work.append((parent, iter(self.parents_dict.get(parent, ()))))
+                        elif parent in on_stack:
+                            low[sec] = min(low[sec], order[parent])
+                        continue
+                    work.pop()
+                    if work:
+                        low[work[-1][0]] = min(low[work[-1][0]], low[sec])
+                    if low[sec] != order[sec]:
+                        continue
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == sec:
+                            break
+                    self.set_component_best(component, sec_val_dict, best)
+            # the components are emitted in the iteration order of the parents sets, which depends on the hash seed
+            self.cycles.sort()
+            max_v = max((best[sec] for sec in sec_val_dict), default=-1)
+            logger.debug("Loop counts calculated successfully.")
             return max_v
-            logger.info("Loop counts calculated successfully.")
         except Exception as e:
             logger.exception("Failed to calculate loop counts.")
 
+    def set_component_best(self, component, sec_val_dict, best):
+        members = set(component)
+        if len(component) > 1 or component[0] in self.parents_dict.get(component[0], ()):
+            cycle = sorted(members)
+            logger.warning("Recursive PERFORM found between sections: %s", cycle)
+            self.cycles.append(cycle)
+        value = sum(sec_val_dict.get(sec, 0) for sec in component)
+        parents_best = [best[parent] for sec in component for parent in self.parents_dict.get(sec, ())
+                        if parent not in members]
+        value += max(parents_best, default=0)
+        for sec in component:
+            best[sec] = value
+
     def get_loop_value(self, string):
         if not string:
             return 0
@@ -58,15 +128,6 @@ class LoopAnalyzer:
         else:
             raise RuntimeError("incorrect input for loop definition")
 
-    @staticmethod
-    def is_label_line(line):
-        elems = re.split("\s+", line)
-        assert re.match("\d{6}", elems[0]), f"ERROR in is_label_line: {line}"
-        if re.search("^(\w|-)+\.$", elems[1]):
-            return True
-        else:
-            return False
-
     def is_GOTO_loop(self, idx):
         """
         identify is there a GOTO_loop around the given line No in current section
@@ -76,47 +137,7 @@ class LoopAnalyzer:
             which means there is a loop.
         label's definition:in the front of line except the row number, label name don't include space.
         """
-        # Find the preceding label
-        label_start = idx
-        while label_start > 0 and not LoopAnalyzer.is_label_line(self.text[label_start]):
-            label_start -= 1
-
-        # label not found, like file KA60 in Gr5-denji
-        if not LoopAnalyzer.is_label_line(self.text[label_start]):
-            return False
-
-        label_end = idx
-        while label_end + 1 < len(self.text) and not LoopAnalyzer.is_label_line(self.text[label_end + 1]):
-            label_end += 1
-
-        # Append the label content if it's not already included
-        assert label_end > label_start, "identify_GOTO_loop function Error"
-        label = LoopAnalyzer.get_label_name(self.text[label_start])
-        label_range = self.text[label_start:label_end + 1]
-        if self.is_GOTO_line(label, label_range):
-            # labels.extend(text[label_start:label_end + 1])
-            return True
-        return False
-
-    def is_GOTO_line(self, label, text):
-        for line in text:
-            if re.search("\sGO\s+TO\s+", line):
-                # print(line)
-                go_to_label = re.search("\sGO\s+TO\s+((\w|-|\.)+)", line).group(1)
-                # sometimes GO TO [label], [label] may not include "."
-                if go_to_label.replace(".", "") == label.replace(".", ""):
-                    return True
-        return False
-
-    @staticmethod
-    def get_label_name(line):
-        try:
-            elems = re.split("\s+", line)
-            return re.search("^(\w|-)+\.$", elems[1]).group(0)
-        except Exception as e:
-            print(e)
-            print(f"not found label name: {line}")
-            sys.exit(1)
+        return self.get_spans().is_GOTO_loop(self.text.get_position(idx))
 
     def is_PERFORM_LOOP(self, idx):
         """
@@ -129,50 +150,28 @@ class LoopAnalyzer:
         2) PERFORM VARYING ... UNTIL ...
         ex. Gr5reien: KS24
         """
-        # pattern 2)
-        if self.is_perform_start(self.text[idx:idx + 3]):
-            return True
-        # Scan forward to find " END-PERFORM", making sure we do not encounter labels or sections or another perform loop
-        perform_end = idx
-        while perform_end < len(self.text) and " END-PERFORM" not in self.text[perform_end]:
-            if LoopAnalyzer.is_label_line(self.text[perform_end]) or " SECTION." in self.text[perform_end] or self.is_perform_start(
-                    self.text[perform_end:perform_end + 3]):
-                return False
-            perform_end += 1
-
-        if perform_end < len(self.text) and " END-PERFORM" in self.text[perform_end]:
-            # Scan backward to find the corresponding " PERFORM "
-            perform_start = idx
-            while perform_start > 0 and not LoopAnalyzer.is_label_line(self.text[perform_start]) \
-                    and " SECTION." not in self.text[perform_start] \
-                    and not self.is_perform_start(self.text[perform_start:perform_start + 3]):
-                perform_start -= 1
-
-            if self.is_perform_start(self.text[perform_start:perform_start + 3]):
-                # Validate loop start and capture if valid
-                return True
-            else:
-                raise RuntimeError("Can't find perform start!!")
-        return False
-
-    def is_perform_start(self, lines):
-        # UNTIL [content]  or UNTIL([content])
-        return re.search("\sPERFORM\s", lines[0]) and any(re.search("\sUNTIL(\s|\()", line) for line in lines)
-
-    def identify_all_loop(self, cmd):
-        idxs = FileManager.get_str_idxs(self.text, cmd)
+        return self.get_spans().is_PERFORM_LOOP(self.text.get_position(idx))
+
+    def identify_all_loop(self, cmd, idxs=None):
+        if idxs is None:
+            idxs = [self.text.get_idx(position) for position in FileManager.get_str_idxs(self.text, cmd)]
+        self.identify_loop_by_idxs(idxs)
+
+    def identify_loop_by_idxs(self, idxs):
         # every idx represents a route, ex.: XDBMCR->sectionA->...->MAIN
         for idx in idxs:
-            sec_name, _ = SectionAnalyzer.get_section(self.text, idx)
+            sec_name, _ = self.index.get_section(idx)
             # if found before, skip
             if self.loop_dict.get(sec_name):
                 continue
             is_goto = self.is_GOTO_loop(idx)
             is_perf = self.is_PERFORM_LOOP(idx)
             self.loop_dict[sec_name] = self.def_loop_value(is_goto, is_perf)
-            if self.parents_dict[sec_name]:
-                perform_sec_str = f"\sPERFORM\s+{sec_name}(\.)?\s"
-                self.identify_all_loop(perform_sec_str)
+            self.loop_idxs[sec_name] = idx
+            # the callers of a section are visited once, a recursive PERFORM would never end otherwise
+            if self.parents_dict[sec_name] and sec_name not in self.expanded:
+                self.expanded.add(sec_name)
+                self.identify_loop_by_idxs(self.index.get_perform_idxs(sec_name))
 
     def def_loop_value(self, is_goto, is_perf):
         if is_goto and is_perf:
@@ -0,0 +1,138 @@
+import bisect
+import functools
+from ProgramIndex import ProgramIndex, SEQ_NO_PATTERN, SPLIT_PATTERN, INVALID_LINE, LABEL_LINE, SECTION_LINE, \
+    END_PERFORM_LINE, PERFORM_LINE, UNTIL_LINE, GOTO_LINE
+from SectionView import SectionView
+from RunReport import StageTimer
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LoopSpanIndex:
+    """
+    Loop spans of the view given to LoopAnalyzer, so that every hit is classified by bisect instead of
+    scanning its label range and PERFORM block again.
+    the lines are classified once per program by ProgramIndex.loop_kinds, only the spans are built per view.
+    label_starts: positions of the labels, a label range ends before the next label of the view
+    goto_labels: {label position: position of the GO TO back to its own label, or to no label}
+    forward_stops / backward_stops: positions where the scans of LoopAnalyzer.is_PERFORM_LOOP stop
+    the answers and the errors are the same as the line scans of LoopAnalyzer.
+    """
+    def __init__(self, text, index=None):
+        self.text = text if isinstance(text, SectionView) else SectionView(text)
+        self.index = index if index is not None else ProgramIndex(self.text.text)
+        self.kinds = b"".join(self.index.loop_kinds[start:end + 1] for start, end in self.text.ranges)
+        self.label_starts = []
+        self.goto_labels = dict()
+        # lines failing LoopAnalyzer.is_label_line, the error is raised when a scan reaches them
+        self.invalid_lines = []
+        self.perform_starts = set()
+        self.forward_stops = []
+        self.backward_stops = []
+        self.build()
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def get_table(mask):
+        """bytes.translate table marking the kinds having a bit of mask with 1"""
+        return bytes(1 if kind & mask else 0 for kind in range(256))
+
+    def find_all(self, mask):
+        """:return: positions of the lines having a bit of mask"""
+        flags = self.kinds.translate(LoopSpanIndex.get_table(mask))
+        positions = []
+        position = flags.find(1)
+        while position >= 0:
+            positions.append(position)
+            position = flags.find(1, position + 1)
+        return positions
+
+    def build(self):
+        kinds = self.kinds
+        self.label_starts = self.find_all(LABEL_LINE)
+        self.invalid_lines = self.find_all(INVALID_LINE)
+        for position in self.find_all(GOTO_LINE):
+            pos = bisect.bisect_right(self.label_starts, position) - 1
+            if pos < 0 or pos in self.goto_labels:
+                continue
+            # the first GO TO deciding the label range, as the scan of the label range returns on it
+            target = self.index.goto_targets[self.text.get_idx(position)]
+            label = self.index.loop_labels[self.text.get_idx(self.label_starts[pos])]
+            if target is None or target.replace(".", "") == label.replace(".", ""):
+                self.goto_labels[pos] = position
+
+        # PERFORM ... UNTIL within the next 3 lines, ex. PERFORM VARYING ... / UNTIL ...
+        self.perform_starts = {position for position in self.find_all(PERFORM_LINE)
+                               if any(kind & UNTIL_LINE for kind in kinds[position:position + 3])}
+        stops = set(self.find_all(INVALID_LINE | LABEL_LINE | SECTION_LINE)) | self.perform_starts
+        self.forward_stops = sorted(stops.union(self.find_all(END_PERFORM_LINE)))
+        self.backward_stops = sorted(stops - {0})
+        logger.debug("Loop span index built: %d labels, %d GO TO loops, %d PERFORM starts", len(self.label_starts),
+                     len(self.goto_labels), len(self.perform_starts))
+
+    @staticmethod
+    def check_label_line(line):
+        """raise the error of LoopAnalyzer.is_label_line for an invalid line"""
+        StageTimer.regex_calls += 2
+        elems = SPLIT_PATTERN.split(line)
+        assert SEQ_NO_PATTERN.match(elems[0]), f"ERROR in is_label_line: {line}"
+        return elems[1]
+
+    def check_backward(self, start, idx):
+        """the backward scan from idx to start reads the invalid lines between them"""
+        pos = bisect.bisect_right(self.invalid_lines, idx) - 1
+        if pos >= 0 and self.invalid_lines[pos] >= start:
+            LoopSpanIndex.check_label_line(self.text[self.invalid_lines[pos]])
+
+    def check_forward(self, idx, end):
+        """the forward scan from idx to end reads the invalid lines between them"""
+        pos = bisect.bisect_left(self.invalid_lines, idx)
+        if pos < len(self.invalid_lines) and self.invalid_lines[pos] <= end:
+            LoopSpanIndex.check_label_line(self.text[self.invalid_lines[pos]])
+
+    def is_GOTO_loop(self, idx):
+        """
+        is idx in a label range which has GO TO its own label, see LoopAnalyzer.is_GOTO_loop
+        """
+        pos = bisect.bisect_right(self.label_starts, idx) - 1
+        label_start = self.label_starts[pos] if pos >= 0 else 0
+        self.check_backward(label_start, idx)
+        # label not found
+        if pos < 0:
+            return False
+        label_end = self.label_starts[pos + 1] - 1 if pos + 1 < len(self.label_starts) else len(self.text) - 1
+        self.check_forward(idx + 1, min(label_end + 1, len(self.text) - 1))
+        assert label_end > label_start, "identify_GOTO_loop function Error"
+        if pos not in self.goto_labels:
+            return False
+        line = self.text[self.goto_labels[pos]]
+        if self.index.goto_targets[self.text.get_idx(self.goto_labels[pos])] is None:
+            raise RuntimeError(f"GO TO without a target label: {line}")
+        return True
+
+    def is_PERFORM_LOOP(self, idx):
+        """
+        is idx in a PERFORM ... UNTIL block or on its first lines, see LoopAnalyzer.is_PERFORM_LOOP
+        forward: the first END-PERFORM before a label, section or another PERFORM ... UNTIL
+        backward: from there the nearest label, section or PERFORM ... UNTIL has to be the loop start
+        """
+        if idx in self.perform_starts:
+            return True
+        pos = bisect.bisect_left(self.forward_stops, idx)
+        if pos == len(self.forward_stops):
+            return False
+        perform_end = self.forward_stops[pos]
+        if not self.kinds[perform_end] & END_PERFORM_LINE:
+            self.check_forward(perform_end, perform_end)
+            return False
+        pos = bisect.bisect_right(self.backward_stops, idx) - 1
+        if pos >= 0:
+            perform_start = self.backward_stops[pos]
+            self.check_forward(perform_start, perform_start)
+        else:
+            # the scan ends at the first line without reading it
+            perform_start = 0
+        if perform_start in self.perform_starts:
+            return True
+        raise RuntimeError("Can't find perform start!!")
@@ -0,0 +1,165 @@
+import os
+from AppLogger import AppLogger, init_worker_logging
+from CopybookCache import CopybookCache, SplicedLines
+from FileManager import FileManager
+from LoopAnalyzer import LoopAnalyzer
+from ProgramIndex import ProgramIndex
+from RunReport import MemberProfiler, StageTimer
+from SectionAnalyzer import SectionAnalyzer
+import logging
+
+logger = logging.getLogger(__name__)
+
+# bump when a change of the analysis changes its results, cached results of other versions are not used
+ANALYZER_VERSION = "1.5"
+
+# CopybookCache of this process set by init_copybook_cache, shared by every member it analyzes
+copybook_cache = None
+
+
+class MemberAnalyzer:
+    def __init__(self, text, line_nos=None, timer=None):
+        """
+        text: preprocessed lines of one COBOL member, SplicedLines when its copybooks are expanded
+        line_nos: line No. of every line in the file, returned by FileManager.load_program
+        the structural index is built once and shared by every command analyzed on the member
+        """
+        self.text = text
+        self.line_nos = line_nos
+        with (timer or StageTimer()).stage("program_index"):
+            self.index = ProgramIndex(text)
+
+    @staticmethod
+    def load(file_path, timer=None, copy_group=None, data=None):
+        """
+        read and preprocess a member
+        copy_group: Gr whose copybooks are spliced after their COPY lines, None = COPY is not expanded
+        data: content of the file already read by Prefetcher
+        """
+        timer = timer or StageTimer()
+        text, line_nos = FileManager.load_program(file_path, timer, data)
+        if copy_group is not None:
+            if copybook_cache is None:
+                raise RuntimeError("init_copybook_cache is not called")
+            with timer.stage("expand_copy"):
+                text = copybook_cache.expand(copy_group, text, line_nos)
+        return MemberAnalyzer(text, line_nos, timer)
+
+    def get_origin(self, idx):
+        """:return: copybook name (None for the member itself), line No. in its file of the preprocessed line idx"""
+        if isinstance(self.text, SplicedLines):
+            return self.text.get_origin(idx)
+        return None, self.line_nos[idx] if self.line_nos is not None else idx
+
+    def get_loop_lines(self, loop_idxs):
+        """
+        :return: {section_name: line No. from 1 in the member file, "copybook:line No." for a copybook line}
+        """
+        loop_lines = dict()
+        for sec_name, idx in loop_idxs.items():
+            source, No = self.get_origin(idx)
+            loop_lines[sec_name] = f"{source}:{No + 1}" if source else No + 1
+        return loop_lines
+
+    def analyze(self, cmd, idxs=None, timer=None):
+        """
+        idxs: line No. including cmd, searched here when not given
+        timer: StageTimer of the member
+        the related sections are a SectionView on the program lines and share its index, nothing is copied
+        :return: parents_dict, loop_dict, loop_counts, cycles, loop_lines
+        """
+        timer = timer or StageTimer()
+        if idxs is None:
+            with timer.stage("get_str_idxs"):
+                idxs = FileManager.get_str_idxs(self.text, cmd)
+        with timer.stage("identify_all_rela_section"):
+            sec_analyzer = SectionAnalyzer(self.text, cmd, self.index)
+            # cursively extract the section containing the command and all its parent sections
+            sections, parents_dict = sec_analyzer.identify_all_rela_section(idxs)
+        # identify loops
+        with timer.stage("identify_all_loop"):
+            loop_analyzer = LoopAnalyzer(sections, cmd, parents_dict, self.index)
+            loop_analyzer.identify_all_loop(cmd, idxs)
+        with timer.stage("calc_loop_counts"):
+            loop_counts = loop_analyzer.calc_loop_counts()
+        loop_dict = loop_analyzer.get_loop_dict()
+        return (parents_dict, loop_dict, loop_counts, loop_analyzer.get_cycles(),
+                self.get_loop_lines(loop_analyzer.get_loop_idxs()))
+
+    def analyze_all(self, cmds, timer=None, hits=None):
+        """
+        analyze every command on the member, a failing command does not stop the others
+        hits: {cmd: [line No.]} already found, ex. by the token index, searched here when not given
+        :return: [{"parents_dict", "loop_dict", "loop_counts", "cycles", "loop_lines"} or {"error"}] in order of cmds
+        """
+        timer = timer or StageTimer()
+        results = []
+        # one pass over the lines for all commands, ex. every COPY clause of the member in copy_book mode
+        if hits is None:
+            with timer.stage("get_str_idxs"):
+                hits = FileManager.get_str_idxs_multi(self.text, cmds)
+        for cmd in cmds:
+            try:
+                with AppLogger.context(cmd=cmd):
+                    parents_dict, loop_dict, loop_counts, cycles, loop_lines = self.analyze(cmd, hits[cmd], timer)
+                results.append({"parents_dict": parents_dict, "loop_dict": loop_dict, "loop_counts": loop_counts,
+                                "cycles": cycles, "loop_lines": loop_lines})
+            except Exception as e:
+                logger.error("Failed to analyze cmd: %s", cmd, exc_info=True)
+                results.append({"error": f"{type(e).__name__}: {e}"})
+        return results
+
+
+def init_copybook_cache(members, max_lines=500000):
+    """
+    set the CopybookCache of this process, also the initializer of the pool workers
+    the cache of a former run is kept when it resolves the same members
+    """
+    global copybook_cache
+    if copybook_cache is None or copybook_cache.members is not members:
+        copybook_cache = CopybookCache(members, max_lines)
+    return copybook_cache
+
+
+def init_worker(log_args=None, members=None, max_lines=500000):
+    """
+    initializer of the pool workers
+    log_args: returned by AppLogger.get_worker_args, None = the worker does not log to the AppLogger
+    members: see init_copybook_cache, None = COPY is not expanded
+    """
+    if log_args is not None:
+        init_worker_logging(*log_args)
+    if members is not None:
+        init_copybook_cache(members, max_lines)
+
+
+def analyze_member(file_path, cmds, program_cache=None, profiler=None, copy_group=None, data=None, hits=None):
+    """
+    work unit of the process pool: read, preprocess and analyze one member for all of its commands
+    program_cache: ProgramCache of the serial mode, the worker processes load the member themselves
+    profiler: parameters of MemberProfiler, None = no profiling
+    copy_group: Gr whose copybooks are expanded, None = COPY is not expanded
+    data: content of the file already read by Prefetcher
+    hits: {cmd: [line No.]} already found, ex. by the token index, None = searched in the member
+    :return: [result] in order of cmds, {"stages", "regex_calls", "lines", "sections", ...} of the member
+    """
+    timer = StageTimer()
+    program = None
+    member_name = os.path.splitext(os.path.basename(file_path))[0]
+    with MemberProfiler(**(profiler or {})) as member_profiler, AppLogger.context(COBOL=member_name):
+        try:
+            if program_cache is not None:
+                program = program_cache.get(file_path, timer, copy_group, data)
+            else:
+                program = MemberAnalyzer.load(file_path, timer, copy_group, data)
+        except Exception as e:
+            logger.error("Failed to load member: %s", file_path, exc_info=True)
+            results = [{"error": f"{type(e).__name__}: {e}"} for _ in cmds]
+        else:
+            results = program.analyze_all(cmds, timer, hits)
+    stats = {"stages": dict(timer.stages), "regex_calls": timer.get_regex_calls()}
+    if program is not None:
+        stats["lines"] = len(program.text)
+        stats["sections"] = len(program.index.sections)
+    member_profiler.collect(member_name, stats)
+    return results, stats
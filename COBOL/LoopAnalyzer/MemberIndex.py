@@ -0,0 +1,170 @@
+import collections.abc
+import json
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class GroupMembers(collections.abc.Mapping):
+    def __init__(self, Gr, folder, dirs=None):
+        """
+        member files of one group folder, {member_name: file_path}
+        dirs: {dir_path: {"mtime": st_mtime_ns, "files": [file_name], "subdirs": [dir_name]}} in os.walk order
+        """
+        self.Gr = Gr
+        self.folder = folder
+        self.dirs = dirs or dict()
+        self.members = dict()
+        self.duplicates = collections.defaultdict(list)
+        self.validated = False
+        self.changed = False
+        self.build_members()
+
+    @staticmethod
+    def get_member_name(filename):
+        parts = filename.split('%')
+        return parts[-1].replace(".txt", "").replace(".cob", "")
+
+    def build_members(self):
+        self.members = dict()
+        self.duplicates = collections.defaultdict(list)
+        for root, entry in self.dirs.items():
+            for filename in entry["files"]:
+                member_name = GroupMembers.get_member_name(filename)
+                file_path = os.path.join(root, filename)
+                if member_name in self.members:
+                    if not self.duplicates[member_name]:
+                        self.duplicates[member_name].append(self.members[member_name])
+                    self.duplicates[member_name].append(file_path)
+                # the last one found wins, the same as the former full os.walk
+                self.members[member_name] = file_path
+
+    def refresh(self):
+        """
+        revalidate the index with directory mtimes, only the changed directories are listed again
+        """
+        logger.info("Validating member index of group %s", self.Gr)
+        dirs = dict()
+        rewalked = 0
+        stack = [self.folder]
+        while stack:
+            dir_path = stack.pop()
+            try:
+                mtime = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                continue
+            entry = self.dirs.get(dir_path)
+            if entry is None or entry["mtime"] != mtime:
+                entry = GroupMembers.list_dir(dir_path, mtime)
+                rewalked += 1
+            dirs[dir_path] = entry
+            # depth first in listing order, the same as os.walk
+            stack.extend(os.path.join(dir_path, name) for name in reversed(entry["subdirs"]))
+        self.changed = self.changed or rewalked > 0 or dirs.keys() != self.dirs.keys()
+        self.dirs = dirs
+        self.build_members()
+        self.validated = True
+        logger.info("Member index of group %s validated: %d directories, %d rewalked, %d members",
+                    self.Gr, len(dirs), rewalked, len(self.members))
+        for member_name, file_paths in self.duplicates.items():
+            logger.warning("Duplicate member %s in group %s: %s", member_name, self.Gr, file_paths)
+
+    @staticmethod
+    def list_dir(dir_path, mtime):
+        files, subdirs = [], []
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                if entry.is_dir():
+                    # like os.walk, symbolic links to directories are not followed
+                    if not entry.is_symlink():
+                        subdirs.append(entry.name)
+                else:
+                    files.append(entry.name)
+        return {"mtime": mtime, "files": files, "subdirs": subdirs}
+
+    def get(self, member_name, default=None):
+        if not self.validated:
+            self.refresh()
+        return self.members.get(member_name, default)
+
+    def __getitem__(self, member_name):
+        file_path = self.get(member_name)
+        if file_path is None:
+            raise KeyError(member_name)
+        return file_path
+
+    def __iter__(self):
+        if not self.validated:
+            self.refresh()
+        return iter(self.members)
+
+    def __len__(self):
+        if not self.validated:
+            self.refresh()
+        return len(self.members)
+
+
+class MemberIndex(collections.abc.Mapping):
+    def __init__(self, mapping_dict, cache_dir):
+        """
+        member index of every group folder persisted in cache_dir, {Gr: GroupMembers}
+        groups are validated lazily on their first lookup, so a run only pays for the groups it uses,
+        and validating a saved group costs one stat per directory instead of listing every member file
+        """
+        self.mapping_dict = mapping_dict
+        self.index_path = os.path.join(cache_dir, "member_index.json")
+        self.groups = {Gr: GroupMembers(Gr, folder) for Gr, folder in mapping_dict.items()}
+
+    def load(self):
+        if not os.path.exists(self.index_path):
+            logger.info("No saved member index found at %s", self.index_path)
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            logger.warning("Failed to load the member index %s, it will be rebuilt", self.index_path, exc_info=True)
+            return
+        for Gr, folder in self.mapping_dict.items():
+            # the folder of the group may have been changed in mapping_dict
+            if Gr in saved and saved[Gr]["folder"] == folder:
+                self.groups[Gr] = GroupMembers(Gr, folder, saved[Gr]["dirs"])
+        logger.info("Member index loaded from %s", self.index_path)
+
+    def refresh(self):
+        for group in self.groups.values():
+            group.refresh()
+
+    def save(self):
+        if not any(group.changed for group in self.groups.values()):
+            return
+        folder_path = os.path.dirname(self.index_path)
+        if folder_path and not os.path.exists(folder_path):
+            os.makedirs(folder_path)
+        saved = {Gr: {"folder": group.folder, "dirs": group.dirs} for Gr, group in self.groups.items()}
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(saved, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+        for group in self.groups.values():
+            group.changed = False
+        logger.info("Member index saved to %s", self.index_path)
+
+    def get_duplicates(self, groups=None):
+        """
+        groups: Gr to report, None = all of them
+        :return: {Gr: {member_name: [file_path]}} of the groups validated in this run,
+                 a group only loaded from the saved index is not checked and not reported
+        """
+        return {Gr: dict(group.duplicates) for Gr, group in self.groups.items()
+                if group.validated and group.duplicates and (groups is None or str(Gr) in groups)}
+
+    def __getitem__(self, Gr):
+        return self.groups[Gr]
+
+    def __iter__(self):
+        return iter(self.groups)
+
+    def __len__(self):
+        return len(self.groups)
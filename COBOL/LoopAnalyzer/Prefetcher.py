@@ -0,0 +1,88 @@
+import collections
+import concurrent.futures
+import functools
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    def __init__(self, depth=8, max_bytes=64 * 1024 * 1024, threads=4):
+        """
+        read the upcoming members with threads while the current one is analyzed,
+        the reads of a slow network share release the GIL and overlap with the analysis
+        depth: max number of members read ahead
+        max_bytes: no more member is read ahead while the members read ahead hold this many bytes,
+                   the size of a member is reserved from its os.stat when its read is submitted
+        """
+        self.depth = max(depth, 1)
+        self.max_bytes = max_bytes
+        self.threads = max(threads, 1)
+        self.hits = 0
+        self.waits = 0
+
+    @staticmethod
+    def read(file_path):
+        with open(file_path, 'rb') as f:
+            return f.read()
+
+    @staticmethod
+    def get_size(file_path):
+        """:return: size to reserve for the member, 0 when it cannot be stat'ed, its read fails then"""
+        try:
+            return os.stat(file_path).st_size
+        except OSError:
+            return 0
+
+    @staticmethod
+    def log_failure(file_path, future):
+        """done callback of a read, the failure is logged when it happens, not when the member comes up"""
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Failed to prefetch member: %s", file_path, exc_info=future.exception())
+
+    def prefetch(self, file_paths):
+        """
+        a missing or unreadable file is reported as soon as its read fails, before the member is analyzed
+        :return: generator of (file_path, content or None, exception or None) in order of file_paths
+        """
+        file_paths = iter(file_paths)
+        pending = collections.deque()
+        # bytes of the members read ahead, reserved when their reads are submitted
+        reserved = 0
+        # (file_path, size) of the next member, kept until it fits in the budget
+        upcoming = None
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="prefetch")
+        try:
+            while True:
+                while len(pending) < self.depth:
+                    if upcoming is None:
+                        file_path = next(file_paths, None)
+                        if file_path is None:
+                            break
+                        upcoming = file_path, Prefetcher.get_size(file_path)
+                    file_path, size = upcoming
+                    # the next member is always read, even when it is over the budget by itself
+                    if pending and reserved + size > self.max_bytes:
+                        break
+                    future = executor.submit(Prefetcher.read, file_path)
+                    future.add_done_callback(functools.partial(Prefetcher.log_failure, file_path))
+                    pending.append((file_path, size, future))
+                    reserved += size
+                    upcoming = None
+                if not pending:
+                    return
+                file_path, size, future = pending.popleft()
+                reserved -= size
+                if future.done():
+                    self.hits += 1
+                else:
+                    self.waits += 1
+                try:
+                    data, error = future.result(), None
+                except Exception as e:
+                    # already logged by log_failure
+                    data, error = None, e
+                yield file_path, data, error
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,57 @@
+import collections
+import os
+from MemberAnalyzer import MemberAnalyzer
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ProgramCache:
+    def __init__(self, maxsize=128, check_stat=False):
+        """
+        LRU cache of preprocessed programs, {(file_path, copy_group): MemberAnalyzer}
+        members listed under several groups or input types are read and preprocessed only once
+        check_stat: a program whose file mtime or size changed is loaded again, for long-running processes
+        """
+        self.maxsize = maxsize
+        self.check_stat = check_stat
+        self.programs = collections.OrderedDict()
+        self.stats = dict()
+        self.invalidations = 0
+        self.hits = 0
+        self.misses = 0
+
+    def contains(self, file_path, copy_group=None):
+        return (file_path, copy_group) in self.programs
+
+    def get(self, file_path, timer=None, copy_group=None, data=None):
+        """
+        timer: StageTimer of the member, only a miss spends time on loading
+        copy_group: see MemberAnalyzer.load, the expanded program is cached apart from the plain one
+        data: content of the file already read by Prefetcher, used on a miss
+        """
+        key = (file_path, copy_group)
+        stat = None
+        if self.check_stat:
+            stat = os.stat(file_path)
+            stat = (stat.st_mtime_ns, stat.st_size)
+            if key in self.programs and self.stats[key] != stat:
+                logger.info("Member changed on disk: %s", file_path)
+                self.invalidations += 1
+                del self.programs[key]
+        if key in self.programs:
+            self.hits += 1
+            self.programs.move_to_end(key)
+            return self.programs[key]
+        self.misses += 1
+        program = MemberAnalyzer.load(file_path, timer, copy_group, data)
+        self.programs[key] = program
+        self.stats[key] = stat
+        if len(self.programs) > self.maxsize:
+            dropped, _ = self.programs.popitem(last=False)
+            del self.stats[dropped]
+        return program
+
+    def clear(self):
+        self.programs.clear()
+        self.stats.clear()
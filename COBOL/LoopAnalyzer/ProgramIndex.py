@@ -0,0 +1,172 @@
+import bisect
+import collections
+import re
+import logging
+from RunReport import StageTimer
+
+logger = logging.getLogger(__name__)
+
+SECTION_PATTERN = re.compile(r"\sSECTION\.")
+SECTION_NAME_PATTERN = re.compile(r"(\w|-)+")
+SEQ_NO_PATTERN = re.compile(r"\d{6}")
+# only the whitespace before PERFORM is consumed, so "PERFORM A PERFORM B" and "PERFORM PERFORM B" find every call
+PERFORM_PATTERN = re.compile(r"\s(?=PERFORM\s+((?:\w|-)+)(\.)?\s)")
+SPLIT_PATTERN = re.compile(r"\s+")
+WHITESPACE_PATTERN = re.compile(r"\s")
+# the second field of the line is "[label name].", after "[seq No.]..." and a whitespace
+LOOP_LABEL_PATTERN = re.compile(r"\S*\s+((?:\w|-)+\.)(?!\S)")
+PERFORM_START_PATTERN = re.compile(r"\sPERFORM\s")
+UNTIL_PATTERN = re.compile(r"\sUNTIL(\s|\()")
+GOTO_PATTERN = re.compile(r"\sGO\s+TO\s+")
+GOTO_LABEL_PATTERN = re.compile(r"\sGO\s+TO\s+((\w|-|\.)+)")
+
+# bits of ProgramIndex.loop_kinds
+INVALID_LINE = 1
+LABEL_LINE = 2
+SECTION_LINE = 4
+END_PERFORM_LINE = 8
+PERFORM_LINE = 16
+UNTIL_LINE = 32
+GOTO_LINE = 64
+
+
+class ProgramIndex:
+    """
+    Structural index of one preprocessed COBOL program, built in a single pass over the lines.
+    sections: [(section_name, start_idx, end_idx)] in source order
+    labels: [(label_name, idx)] in source order
+    perform_dict: {callee: [line No. of "PERFORM callee"]}
+    callers_dict / callees_dict: PERFORM graph between sections, {section_name: set(section_name)}
+    loop_kinds: bits of every line read by LoopSpanIndex, INVALID_LINE is a line without "[seq No.] ..."
+    loop_labels: {line No.: label name} of the LABEL_LINE, goto_targets: {line No.: label or None} of the GOTO_LINE
+    """
+    def __init__(self, text):
+        self.text = text
+        self.sections = []
+        self.section_starts = []
+        self.labels = []
+        self.label_starts = []
+        self.perform_dict = collections.defaultdict(list)
+        self.callers_dict = collections.defaultdict(set)
+        self.callees_dict = collections.defaultdict(set)
+        self.loop_kinds = bytearray(len(text))
+        self.loop_labels = dict()
+        self.goto_targets = dict()
+        self.build()
+
+    def build(self):
+        logger.debug("Building program index for %d lines", len(self.text))
+        section_names = []
+        # regex calls of this pass, added to StageTimer once per program
+        calls = 0
+        for No, line in enumerate(self.text):
+            kind, line_calls = self.get_loop_kind(No, line)
+            self.loop_kinds[No] = kind
+            calls += line_calls + 1
+            if SECTION_PATTERN.search(line):
+                section_names.append(ProgramIndex.parse_section_name(line))
+                self.section_starts.append(No)
+                calls += 2
+            elif kind & LABEL_LINE:
+                # "[seq No.]... [label name]." is the same label line as LoopAnalyzer reads
+                self.labels.append((self.loop_labels[No], No))
+                self.label_starts.append(No)
+            if "PERFORM" in line:
+                calls += 1
+                for match in PERFORM_PATTERN.finditer(line):
+                    idxs = self.perform_dict[match.group(1)]
+                    if not idxs or idxs[-1] != No:
+                        idxs.append(No)
+        StageTimer.regex_calls += calls
+
+        ends = [start - 1 for start in self.section_starts[1:]] + [len(self.text) - 1]
+        self.sections = list(zip(section_names, self.section_starts, ends))
+
+        # caller -> callee graph, a PERFORM outside any section has no caller
+        for callee, idxs in self.perform_dict.items():
+            for idx in idxs:
+                pos = bisect.bisect_right(self.section_starts, idx) - 1
+                if pos < 0:
+                    continue
+                caller = self.sections[pos][0]
+                self.callers_dict[callee].add(caller)
+                self.callees_dict[caller].add(callee)
+        logger.debug("Program index built: %d sections, %d labels", len(self.sections), len(self.labels))
+
+    def get_loop_kind(self, No, line):
+        """:return: bits of the line in loop_kinds, number of regex calls made"""
+        kind = 0
+        calls = 1
+        valid = SEQ_NO_PATTERN.match(line)
+        if valid:
+            calls += 1
+            valid = WHITESPACE_PATTERN.search(line)
+        if not valid:
+            kind |= INVALID_LINE
+        else:
+            calls += 1
+            match = LOOP_LABEL_PATTERN.match(line)
+            if match:
+                kind |= LABEL_LINE
+                self.loop_labels[No] = match.group(1)
+        if " SECTION." in line:
+            kind |= SECTION_LINE
+        if " END-PERFORM" in line:
+            kind |= END_PERFORM_LINE
+        if "PERFORM" in line:
+            calls += 1
+            if PERFORM_START_PATTERN.search(line):
+                kind |= PERFORM_LINE
+        if "UNTIL" in line:
+            calls += 1
+            if UNTIL_PATTERN.search(line):
+                kind |= UNTIL_LINE
+        if "GO" in line:
+            calls += 1
+            if GOTO_PATTERN.search(line):
+                kind |= GOTO_LINE
+                calls += 1
+                match = GOTO_LABEL_PATTERN.search(line)
+                self.goto_targets[No] = match.group(1) if match else None
+        return kind, calls
+
+    @staticmethod
+    def parse_section_name(line):
+        elems = SPLIT_PATTERN.split(line)
+        result = SECTION_NAME_PATTERN.search(elems[1])
+        assert result, f"not found section name: {line}"
+        return result.group(0)
+
+    def get_section(self, idx):
+        """
+        find the section containing the idx line
+        :return: section_name, (start_idx, end_idx)
+        """
+        pos = bisect.bisect_right(self.section_starts, idx) - 1
+        if pos < 0:
+            logger.error("Cannot find section start for line: %s", self.text[idx])
+            raise RuntimeError("Can't find section for the line {}".format(self.text[idx]))
+        section_name, start_idx, end_idx = self.sections[pos]
+        return section_name, (start_idx, end_idx)
+
+    def get_label(self, idx):
+        """
+        find the label range containing the idx line, the range ends before the next label
+        :return: label_name, (start_idx, end_idx) or None when there is no label before idx
+        """
+        pos = bisect.bisect_right(self.label_starts, idx) - 1
+        if pos < 0:
+            return None
+        label_name, start_idx = self.labels[pos]
+        end_idx = self.label_starts[pos + 1] - 1 if pos + 1 < len(self.labels) else len(self.text) - 1
+        return label_name, (start_idx, end_idx)
+
+    def get_perform_idxs(self, section_name):
+        """line No. of every "PERFORM section_name" """
+        return self.perform_dict.get(section_name, [])
+
+    def get_callers(self, section_name):
+        return self.callers_dict.get(section_name, set())
+
+    def get_callees(self, section_name):
+        return self.callees_dict.get(section_name, set())
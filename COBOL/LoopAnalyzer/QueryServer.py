@@ -0,0 +1,165 @@
+"""
+Local query daemon keeping the member index and the parsed programs hot between ad-hoc questions.
+
+python QueryServer.py --mapping mapping.json --port 8765
+curl "http://127.0.0.1:8765/query?Gr=5&COBOL=KS24&cmd=GET-NEXT"
+"""
+import argparse
+import collections
+import http.server
+import json
+import threading
+import time
+import urllib.parse
+from AppLogger import AppLogger, LOG_LEVELS
+from FileManager import FileManager
+from ProgramCache import ProgramCache
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class QueryServer:
+    def __init__(self, mapping_dict, cache_dir=".analyze_cache", program_cache_size=256, result_cache_size=4096):
+        """
+        answer (Gr, COBOL, cmd) with the same analysis as Application, the programs are kept in an LRU cache
+        and loaded again when their file changes on disk
+        """
+        self.file_manager = FileManager(mapping_dict, None, cache_dir)
+        self.file_manager.build_member_dict()
+        self.program_cache = ProgramCache(program_cache_size, check_stat=True)
+        self.result_cache_size = result_cache_size
+        # {(file_path, cmd): (MemberAnalyzer, result)}, valid while the program is the cached one
+        self.results = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.queries = 0
+
+    def get_file_path(self, Gr, COBOL):
+        """
+        a member not found is looked up again after revalidating the group, it may be new on disk
+        """
+        Gr = str(Gr)
+        if Gr not in self.file_manager.member_dict:
+            raise KeyError(f"unknown group: {Gr}")
+        file_path = self.file_manager.get_file_path(Gr, COBOL)
+        if not file_path:
+            self.file_manager.member_dict[Gr].refresh()
+            file_path = self.file_manager.get_file_path(Gr, COBOL)
+        return file_path
+
+    def query(self, Gr, COBOL, cmd):
+        """
+        :return: {"Gr", "COBOL", "cmd", "file_path", "parents_dict", "loop_dict", "loop_counts", "cycles",
+                  "loop_lines", "cached"}
+        """
+        with AppLogger.context(Gr=str(Gr), COBOL=COBOL, cmd=cmd):
+            # only the member index and the caches are shared, the analysis runs outside the lock
+            with self.lock:
+                self.queries += 1
+                file_path = self.get_file_path(Gr, COBOL)
+                if not file_path:
+                    raise KeyError(f"member not found: {COBOL} in group {Gr}")
+                program = self.program_cache.get(file_path)
+                key = (file_path, cmd)
+                cached = key in self.results and self.results[key][0] is program
+                if cached:
+                    self.results.move_to_end(key)
+                    result = self.results[key][1]
+            if not cached:
+                # the program and its index are only read by the analysis, queries on it may run at once
+                parents_dict, loop_dict, loop_counts, cycles, loop_lines = program.analyze(cmd)
+                result = {"parents_dict": {sec: sorted(parents) for sec, parents in sorted(parents_dict.items())},
+                          "loop_dict": loop_dict, "loop_counts": loop_counts, "cycles": cycles,
+                          "loop_lines": loop_lines}
+                with self.lock:
+                    self.results[key] = (program, result)
+                    if len(self.results) > self.result_cache_size:
+                        self.results.popitem(last=False)
+            return {"Gr": str(Gr), "COBOL": COBOL, "cmd": cmd, "file_path": file_path, "cached": cached, **result}
+
+    def get_stats(self):
+        with self.lock:
+            return {"queries": self.queries, "programs": len(self.program_cache.programs),
+                    "program_cache_hits": self.program_cache.hits, "program_cache_misses": self.program_cache.misses,
+                    "invalidations": self.program_cache.invalidations, "results": len(self.results)}
+
+    def serve(self, host="127.0.0.1", port=8765):
+        """
+        GET /query?Gr=&COBOL=&cmd=, GET /stats, only local clients are served by default
+        """
+        server = http.server.ThreadingHTTPServer((host, port), QueryHandler)
+        server.query_server = self
+        logger.info("QueryServer listening on %s:%d", host, port)
+        print(f"QueryServer listening on http://{host}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.file_manager.save_member_dict()
+
+
+class QueryHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        params = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+        query_server = self.server.query_server
+        start = time.perf_counter()
+        if url.path == "/stats":
+            self.send_json(200, query_server.get_stats())
+            return
+        if url.path != "/query":
+            self.send_json(404, {"error": f"unknown path: {url.path}"})
+            return
+        missing = [key for key in ("Gr", "COBOL", "cmd") if not params.get(key)]
+        if missing:
+            self.send_json(400, {"error": f"missing parameters: {missing}"})
+            return
+        try:
+            result = query_server.query(params["Gr"], params["COBOL"], params["cmd"])
+        except KeyError as e:
+            self.send_json(404, {"error": e.args[0]})
+            return
+        except Exception as e:
+            logger.error("Failed to answer %s", self.path, exc_info=True)
+            self.send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        result["seconds"] = time.perf_counter() - start
+        self.send_json(200, result)
+
+    def send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve loop analysis queries of COBOL members on a local port")
+    parser.add_argument("--mapping", required=True,
+                        help="JSON file of mapping_dict, {Gr: folder of the group's members}")
+    parser.add_argument("--cache-dir", default=".analyze_cache", help="member index saved by the batch runs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--program-cache-size", type=int, default=256,
+                        help="number of preprocessed programs kept in memory")
+    parser.add_argument("--log-file", default="server.log")
+    parser.add_argument("--log-level", default="INFO", type=str.upper, choices=LOG_LEVELS)
+    parser.add_argument("--log-json", action="store_true",
+                        help="write one JSON object per record with its Gr, COBOL, cmd and stage")
+    parser.add_argument("--log-max-mb", type=float, default=100, help="the log file is rotated at this size")
+    args = parser.parse_args(argv)
+    with open(args.mapping, 'r', encoding='utf-8') as f:
+        mapping_dict = {str(Gr): folder for Gr, folder in json.load(f).items()}
+    with AppLogger(args.log_file, args.log_level, args.log_json, args.log_max_mb):
+        QueryServer(mapping_dict, args.cache_dir, args.program_cache_size).serve(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import collections
+import hashlib
+import json
+import os
+import sqlite3
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    def __init__(self, cache_dir, version):
+        """
+        persistent cache of analysis results, key = (content hash of the member, cmd, analyzer version)
+        members which have not changed between two data snapshots are not analyzed again
+        """
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self.version = version
+        self.conn = sqlite3.connect(os.path.join(cache_dir, "results.sqlite3"))
+        self.conn.execute("CREATE TABLE IF NOT EXISTS results "
+                          "(content_hash TEXT, cmd TEXT, version TEXT, result TEXT, "
+                          "PRIMARY KEY (content_hash, cmd, version))")
+        self.hits = 0
+        self.misses = 0
+        self.pending = 0
+        logger.info("ResultCache opened in %s", cache_dir)
+
+    @staticmethod
+    def hash_data(data):
+        return hashlib.sha1(data).hexdigest()
+
+    @staticmethod
+    def hash_file(path):
+        with open(path, 'rb') as f:
+            return ResultCache.hash_data(f.read())
+
+    def get(self, content_hash, cmd):
+        """
+        :return: {"parents_dict", "loop_dict", "loop_counts", "cycles", "loop_lines"} or None
+        """
+        row = self.conn.execute("SELECT result FROM results WHERE content_hash=? AND cmd=? AND version=?",
+                                (content_hash, cmd, self.version)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        result = json.loads(row[0])
+        parents_dict = collections.defaultdict(set)
+        for sec, parents in result["parents_dict"].items():
+            parents_dict[sec] = set(parents)
+        result["parents_dict"] = parents_dict
+        return result
+
+    def put(self, content_hash, cmd, result):
+        value = {"parents_dict": {sec: sorted(parents) for sec, parents in result["parents_dict"].items()},
+                 "loop_dict": result["loop_dict"],
+                 "loop_counts": result["loop_counts"],
+                 "cycles": result["cycles"],
+                 "loop_lines": result["loop_lines"]}
+        self.conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                          (content_hash, cmd, self.version, json.dumps(value, ensure_ascii=False)))
+        self.pending += 1
+        if self.pending >= 100:
+            self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self.pending = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
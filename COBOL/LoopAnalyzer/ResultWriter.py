@@ -0,0 +1,142 @@
+import json
+import os
+import time
+import pandas as pd
+from FileManager import FileManager
+import logging
+
+logger = logging.getLogger(__name__)
+
+RESULT_COLUMNS = ["COBOL", "cmd", "parents_dict", "loop_dict", "loop_counts", "cycles", "loop_lines"]
+
+
+class ResultWriter:
+    def __init__(self, output_dir, resume=False, checkpoint_every=100, checkpoint_seconds=30):
+        """
+        append-only JSONL stream of the run, one record per line:
+        {"type": "result", "row", "Gr", "COBOL", "cmd", "parents_dict", "loop_dict", "loop_counts", "cycles",
+         "loop_lines"}
+        {"type": "not_found", "row", "Gr", "COBOL", "cmd"}
+        {"type": "error", "row", "Gr", "COBOL", "cmd", "error"}
+        {"type": "duplicate_member", "Gr", "member", "files"}
+        row is the position in the input data, the final conversion sorts by it.
+        parents_dict, loop_dict, cycles and loop_lines are JSON values, they are printed as text in the workbook.
+        the stream is fsynced every checkpoint_every records or checkpoint_seconds,
+        resume=True keeps the records of the former run and its finished keys are skipped,
+        as are its duplicate members.
+        """
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, "results.jsonl")
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_seconds = checkpoint_seconds
+        self.done_keys = set()
+        # {(Gr, member)} of the duplicate_member records already written
+        self.duplicate_keys = set()
+        if resume:
+            self.done_keys = self.load_done_keys()
+            self.file = open(self.path, 'a', encoding='utf-8')
+        else:
+            self.file = open(self.path, 'w', encoding='utf-8')
+        self.pending = 0
+        self.last_checkpoint = time.monotonic()
+        logger.info("ResultWriter opened %s, %d finished keys", self.path, len(self.done_keys))
+
+    def load_done_keys(self):
+        """
+        :return: {(Gr, COBOL, cmd)} already written as result or not_found, errors are tried again
+        """
+        done_keys = set()
+        if not os.path.exists(self.path):
+            return done_keys
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            # a record cut off by a crash is dropped so the next record starts on its own line
+            end = data.rfind(b"\n") + 1
+            if end != len(data):
+                logger.warning("Dropping the incomplete last record of %s", self.path)
+                f.truncate(end)
+        for line in data[:end].decode('utf-8').splitlines():
+            record = json.loads(line)
+            if record["type"] in ("result", "not_found"):
+                done_keys.add((record["Gr"], record["COBOL"], record["cmd"]))
+            elif record["type"] == "duplicate_member":
+                self.duplicate_keys.add((record["Gr"], record["member"]))
+        return done_keys
+
+    @staticmethod
+    def get_key(row):
+        return str(row["Gr"]), str(row["COBOL"]), str(row["cmd"])
+
+    def is_done(self, row):
+        return ResultWriter.get_key(row) in self.done_keys
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.pending += 1
+        if self.pending >= self.checkpoint_every or time.monotonic() - self.last_checkpoint > self.checkpoint_seconds:
+            self.checkpoint()
+
+    def write_result(self, pos, row, parents_dict, loop_dict, loop_counts, cycles, loop_lines):
+        Gr, COBOL, cmd = ResultWriter.get_key(row)
+        self.write({"type": "result", "row": pos, "Gr": Gr, "COBOL": COBOL, "cmd": cmd,
+                    "parents_dict": parents_dict, "loop_dict": loop_dict, "loop_counts": loop_counts,
+                    "cycles": cycles, "loop_lines": loop_lines})
+
+    def write_not_found(self, pos, row):
+        Gr, COBOL, cmd = ResultWriter.get_key(row)
+        self.write({"type": "not_found", "row": pos, "Gr": Gr, "COBOL": COBOL, "cmd": cmd})
+
+    def write_error(self, pos, row, error):
+        Gr, COBOL, cmd = ResultWriter.get_key(row)
+        self.write({"type": "error", "row": pos, "Gr": Gr, "COBOL": COBOL, "cmd": cmd, "error": error})
+
+    def write_duplicate_member(self, Gr, member_name, file_paths):
+        if (str(Gr), member_name) in self.duplicate_keys:
+            return
+        self.duplicate_keys.add((str(Gr), member_name))
+        self.write({"type": "duplicate_member", "Gr": str(Gr), "member": member_name, "files": file_paths})
+
+    def checkpoint(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_checkpoint = time.monotonic()
+
+    def close(self):
+        self.checkpoint()
+        self.file.close()
+        logger.info("ResultWriter closed %s", self.path)
+
+    def read_records(self, record_type):
+        """
+        :return: records of record_type in order of the input data, the last one wins for the same row
+        """
+        records = dict()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                if record["type"] == record_type:
+                    records[record["row"]] = record
+        return [records[row] for row in sorted(records)]
+
+    @staticmethod
+    def to_cell(column, value):
+        """JSON value of a record as the text of a workbook cell, the text of older streams is kept"""
+        if column == "cycles" and value == []:
+            return ""
+        return str(value) if isinstance(value, (dict, list)) else value
+
+    def to_dict(self):
+        records = self.read_records("result")
+        # records resumed from a stream of an older version have no loop_lines
+        return {column: [ResultWriter.to_cell(column, record.get(column, "")) for record in records]
+                for column in RESULT_COLUMNS}
+
+    def to_excel(self, file_name="results.xlsx"):
+        FileManager.write_to_excel(self.to_dict(), os.path.join(self.output_dir, file_name))
+
+    def to_parquet(self, file_name="results.parquet"):
+        # needs pyarrow or fastparquet
+        pd.DataFrame(self.to_dict()).to_parquet(os.path.join(self.output_dir, file_name))
@@ -0,0 +1,154 @@
+import collections
+import contextlib
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+from AppLogger import AppLogger
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimer:
+    # regex calls (match, search, split, finditer) done by the member analysis in this process,
+    # every pass over the lines counts them locally and adds them once, per member as the difference
+    regex_calls = 0
+
+    def __init__(self):
+        self.stages = collections.defaultdict(float)
+        self.start_regex_calls = StageTimer.regex_calls
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """the records logged inside carry the stage"""
+        start = time.perf_counter()
+        try:
+            with AppLogger.context(stage=name):
+                yield
+        finally:
+            self.stages[name] += time.perf_counter() - start
+
+    def get_regex_calls(self):
+        return StageTimer.regex_calls - self.start_regex_calls
+
+
+class MemberProfiler:
+    def __init__(self, profile_seconds=None, memory_bytes=None, profile_dir="profiles"):
+        """
+        opt-in profiling of one member, the data is kept only for members over a threshold
+        profile_seconds: cProfile stats are dumped to profile_dir for members slower than this
+        memory_bytes: tracemalloc top allocations are kept for members whose peak is over this,
+                      they are the difference from a snapshot taken when the member starts
+        """
+        self.profile_seconds = profile_seconds
+        self.memory_bytes = memory_bytes
+        self.profile_dir = profile_dir
+        self.profile = None
+        self.start = 0
+        self.tracing = False
+        self.snapshot = None
+        self.peak_memory = 0
+        self.top_allocations = None
+
+    @staticmethod
+    def take_snapshot():
+        # the allocations of cProfile and tracemalloc themselves are not of interest
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, cProfile.__file__),
+                                                          tracemalloc.Filter(False, tracemalloc.__file__)])
+
+    def __enter__(self):
+        if self.memory_bytes is not None:
+            # tracing started by someone else is left running
+            self.tracing = not tracemalloc.is_tracing()
+            if self.tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self.snapshot = MemberProfiler.take_snapshot()
+        if self.profile_seconds is not None:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self.start
+        if self.profile:
+            self.profile.disable()
+        if self.memory_bytes is not None:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            if self.peak_memory > self.memory_bytes:
+                diffs = MemberProfiler.take_snapshot().compare_to(self.snapshot, "lineno")
+                self.top_allocations = [str(diff) for diff in diffs[:10]]
+            self.snapshot = None
+            if self.tracing:
+                tracemalloc.stop()
+        return False
+
+    def collect(self, name, stats):
+        """
+        add the profiling data of the member to stats when it is over a threshold
+        """
+        if self.memory_bytes is not None:
+            stats["peak_memory"] = self.peak_memory
+            if self.top_allocations is not None:
+                stats["top_allocations"] = self.top_allocations
+        if self.profile and self.seconds > self.profile_seconds:
+            if not os.path.exists(self.profile_dir):
+                os.makedirs(self.profile_dir)
+            stats["profile"] = os.path.join(self.profile_dir, f"{name}.prof")
+            self.profile.dump_stats(stats["profile"])
+
+
+class RunReport:
+    def __init__(self, top_n=20):
+        """
+        per member timings of a run, written as JSON by write()
+        member: {"file_path", "rows", "lines", "sections", "regex_calls", "stages": {stage: seconds}, "total"}
+        """
+        self.top_n = top_n
+        self.members = dict()
+        self.stages = collections.defaultdict(float)
+        self.start = time.perf_counter()
+
+    def add_stage(self, file_path, stage, seconds):
+        member = self.get_member(file_path)
+        member["stages"][stage] = member["stages"].get(stage, 0) + seconds
+        member["total"] += seconds
+        self.stages[stage] += seconds
+
+    def add_member(self, file_path, rows, stats):
+        """
+        stats: returned by MemberAnalyzer.analyze_member
+        """
+        member = self.get_member(file_path)
+        member["rows"] = rows
+        for key, value in stats.items():
+            if key == "stages":
+                for stage, seconds in value.items():
+                    self.add_stage(file_path, stage, seconds)
+            else:
+                member[key] = value
+
+    def get_member(self, file_path):
+        if file_path not in self.members:
+            self.members[file_path] = {"file_path": file_path, "rows": 0, "stages": dict(), "total": 0}
+        return self.members[file_path]
+
+    def to_dict(self):
+        members = list(self.members.values())
+        slowest = sorted(members, key=lambda member: member["total"], reverse=True)[:self.top_n]
+        return {"wall_seconds": time.perf_counter() - self.start,
+                "members": len(members),
+                "stages": dict(self.stages),
+                "slowest": [member["file_path"] for member in slowest],
+                "member_stats": members}
+
+    def write(self, path):
+        report = self.to_dict()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info("Run report written to %s", path)
+        print("stage seconds:", {stage: round(seconds, 3) for stage, seconds in report["stages"].items()})
+        print(f"top {len(report['slowest'])} slowest members written to {path}")
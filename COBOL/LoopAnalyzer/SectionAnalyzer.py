@@ -3,6 +3,9 @@ import re
 import sys
 import copy
 from FileManager import FileManager
+from ProgramIndex import ProgramIndex
+from SectionView import SectionView
+from AppLogger import SAMPLED
 import collections
 import logging
 
@@ -10,28 +13,18 @@ logger = logging.getLogger(__name__)
 
 
 class SectionAnalyzer:
-    def __init__(self, text, cmd):
+    def __init__(self, text, cmd, index=None):
         self.text = text
         self.cmd = cmd
+        self.index = index if index is not None else ProgramIndex(text)
+        self.section_ranges = []
 
-    @staticmethod
-    def get_section(text, idx):
-        logger.debug("Getting section for index: %d", idx)
+    def get_section(self, idx):
         """ Helper function to find a single section containing the idx line """
-        start_idx = idx
-        # Find the beginning of the section
-        while idx > 0 and not SectionAnalyzer.is_section_line(text[start_idx]):
-            start_idx -= 1
-        if not SectionAnalyzer.is_section_line(text[start_idx]):
-            logger.error("Cannot find section start for line: %s", text[start_idx])
-            raise RuntimeError("Can't find section for the line {}".format(text[start_idx]))
-
-        # Find the end of the section
-        end_idx = idx
-        while end_idx + 1 < len(text) and not SectionAnalyzer.is_section_line(text[end_idx + 1]):
-            end_idx += 1
-        section_name = SectionAnalyzer.get_section_name(text[start_idx])
-        logger.info("Section found: %s from index %d to %d", section_name, start_idx, end_idx)
+        section_name, (start_idx, end_idx) = self.index.get_section(idx)
+        # called for every hit, sampled by the AppLogger
+        logger.debug("Section found for index %d: %s from index %d to %d", idx, section_name, start_idx, end_idx,
+                     extra=SAMPLED)
         return section_name, (start_idx, end_idx)
 
     @staticmethod
@@ -49,14 +42,13 @@ class SectionAnalyzer:
         section_ranges = set()
         section_names = set()
         for idx in idxs:
-            section_name, section_range = SectionAnalyzer.get_section(self.text, idx)
+            section_name, section_range = self.get_section(idx)
             section_names.add(section_name)
             section_ranges.add(section_range)
         return section_names, section_ranges
 
     def have_parent_section(self, section_name):
-        perform_sec_str = f"\sPERFORM\s+{section_name}(\.)?\s"
-        idxs = FileManager.get_str_idxs(self.text, perform_sec_str)
+        idxs = self.index.get_perform_idxs(section_name)
         if not idxs:
             return False
         else:
@@ -70,9 +62,12 @@ class SectionAnalyzer:
         cur_sec_names, cur_sec_ranges = self.get_section_by_idxs(idxs)
         return cur_sec_names, cur_sec_ranges
 
-    def identify_all_rela_section(self):
+    def identify_all_rela_section(self, idxs=None):
         """
         Recursively find and extract the section containing a command and all its parent sections.
+        idxs: line No. including the command when they are already searched, ex. by FileManager.get_str_idxs_multi
+        section_ranges: the ranges of extracted sections in self.text, in order of sections
+        :return: SectionView of the extracted sections on self.text, parents_dict
         """
         def find_all_parents(section_name, section_names, section_ranges, parents_dict):
             idxs = self.have_parent_section(section_name)
@@ -89,16 +84,15 @@ class SectionAnalyzer:
                     continue
                 find_all_parents(cur_sec_name, section_names, section_ranges, parents_dict)
 
-        sections = []
         parents_dict = collections.defaultdict(set)
         # get the line No including cmd
-        idxs = FileManager.get_str_idxs(self.text, self.cmd)
+        if idxs is None:
+            idxs = FileManager.get_str_idxs(self.text, self.cmd)
         # get all sections including line No.
         section_names, section_ranges = self.get_section_by_idxs(idxs)
         # get the parent section which using the current section
         for section_name in copy.deepcopy(section_names):
             find_all_parents(section_name, section_names, section_ranges, parents_dict)
 
-        for start, end in sorted(section_ranges, key=lambda x: x[0]):
-            sections.extend(self.text[start:end + 1])
-        return sections, parents_dict
+        self.section_ranges = sorted(section_ranges, key=lambda x: x[0])
+        return SectionView(self.text, self.section_ranges), parents_dict
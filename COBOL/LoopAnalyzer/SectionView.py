@@ -0,0 +1,64 @@
+import bisect
+import collections.abc
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SectionView(collections.abc.Sequence):
+    """
+    Read-only view of line ranges of a program, the lines are shared with the program and not copied.
+    ranges: [(start_idx, end_idx)] sorted and disjoint, both ends included as in ProgramIndex.sections
+    a position is the line No. in the view, an idx is the line No. in the program
+    """
+    def __init__(self, text, ranges=None):
+        self.text = text
+        if ranges is None:
+            ranges = [(0, len(text) - 1)]
+        self.ranges = [(start, end) for start, end in ranges if end >= start]
+        self.idx_starts = [start for start, end in self.ranges]
+        self.starts = []
+        self.length = 0
+        for start, end in self.ranges:
+            self.starts.append(self.length)
+            self.length += end - start + 1
+
+    def __len__(self):
+        return self.length
+
+    def get_idx(self, position):
+        """:return: line No. in the program of the position"""
+        if position < 0:
+            position += self.length
+        if not 0 <= position < self.length:
+            raise IndexError("SectionView index out of range")
+        pos = bisect.bisect_right(self.starts, position) - 1
+        return self.ranges[pos][0] + position - self.starts[pos]
+
+    def get_position(self, idx):
+        """:return: position in the view of the line No. idx of the program"""
+        pos = bisect.bisect_right(self.idx_starts, idx) - 1
+        if pos < 0 or idx > self.ranges[pos][1]:
+            raise ValueError(f"line {idx} is not in the view")
+        return self.starts[pos] + idx - self.ranges[pos][0]
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            start, stop, step = position.indices(self.length)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            result = []
+            pos = bisect.bisect_right(self.starts, start) - 1
+            while start < stop and pos < len(self.ranges):
+                begin, end = self.ranges[pos]
+                offset = begin + start - self.starts[pos]
+                count = min(end + 1 - offset, stop - start)
+                result.extend(self.text[offset:offset + count])
+                start += count
+                pos += 1
+            return result
+        return self.text[self.get_idx(position)]
+
+    def __iter__(self):
+        for start, end in self.ranges:
+            yield from map(self.text.__getitem__, range(start, end + 1))
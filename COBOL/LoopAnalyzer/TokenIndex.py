@@ -0,0 +1,219 @@
+"""
+Inverted index of the member libraries for pattern queries without the cross reference workbook.
+
+python TokenIndex.py --mapping mapping.json --groups 1 5 --pattern "GET-NEXT"
+"""
+import argparse
+import array
+import collections
+import json
+import os
+import re
+import sqlite3
+from FileManager import FileManager
+from MemberIndex import MemberIndex
+import logging
+
+logger = logging.getLogger(__name__)
+
+# bump when the line No. of FileManager.load_program change, the index is built again
+TOKEN_INDEX_VERSION = "1"
+
+TOKEN_PATTERN = re.compile(r"(?:\w|-)+")
+
+
+class TokenIndex:
+    def __init__(self, cache_dir, member_dict):
+        """
+        identifiers -> {member file: [line No.]} and trigrams -> member files, stored in cache_dir/token_index.sqlite3
+        line No. are of the preprocessed lines returned by FileManager.load_program
+        member_dict: {Gr: {member_name: file_path}}, ex. FileManager.member_dict
+        numbers are not indexed as identifiers, a query on them is narrowed by the trigrams only
+        """
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self.member_dict = member_dict
+        self.conn = sqlite3.connect(os.path.join(cache_dir, "token_index.sqlite3"))
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        row = self.conn.execute("SELECT value FROM meta WHERE key='version'").fetchone()
+        if row is None or row[0] != TOKEN_INDEX_VERSION:
+            logger.info("Building a new token index, version %s", TOKEN_INDEX_VERSION)
+            for table in ("files", "vocabulary", "postings", "trigrams"):
+                self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (TOKEN_INDEX_VERSION,))
+        self.conn.execute("CREATE TABLE IF NOT EXISTS files (file_id INTEGER PRIMARY KEY, Gr TEXT, member TEXT, "
+                          "path TEXT UNIQUE, mtime INTEGER, size INTEGER)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS vocabulary (token_id INTEGER PRIMARY KEY, token TEXT UNIQUE)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS postings (token_id INTEGER, file_id INTEGER, lines BLOB, "
+                          "PRIMARY KEY (token_id, file_id)) WITHOUT ROWID")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS postings_file ON postings (file_id)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS trigrams (trigram TEXT, file_id INTEGER, "
+                          "PRIMARY KEY (trigram, file_id)) WITHOUT ROWID")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS trigrams_file ON trigrams (file_id)")
+        self.conn.commit()
+        self.token_ids = dict(self.conn.execute("SELECT token, token_id FROM vocabulary"))
+
+    @staticmethod
+    def is_identifier(token):
+        return not token.isdigit() and token.strip("-") != ""
+
+    @staticmethod
+    def tokenize(lines):
+        """
+        :return: {identifier: [line No.]}, {trigram}
+        """
+        postings = collections.defaultdict(list)
+        trigrams = set()
+        for No, line in enumerate(lines):
+            for token in set(TOKEN_PATTERN.findall(line)):
+                if TokenIndex.is_identifier(token):
+                    postings[token].append(No)
+            trigrams.update(line[i:i + 3] for i in range(len(line) - 2))
+        return postings, trigrams
+
+    def get_token_id(self, token):
+        if token not in self.token_ids:
+            self.token_ids[token] = self.conn.execute("INSERT INTO vocabulary (token) VALUES (?)",
+                                                      (token,)).lastrowid
+        return self.token_ids[token]
+
+    def remove_file(self, file_id):
+        self.conn.execute("DELETE FROM postings WHERE file_id=?", (file_id,))
+        self.conn.execute("DELETE FROM trigrams WHERE file_id=?", (file_id,))
+        self.conn.execute("DELETE FROM files WHERE file_id=?", (file_id,))
+
+    def index_file(self, Gr, member_name, file_path, stat):
+        row = self.conn.execute("SELECT file_id FROM files WHERE path=?", (file_path,)).fetchone()
+        if row:
+            self.remove_file(row[0])
+        # the file row is added only once the member is tokenized, a member failing here is indexed again next time
+        lines, line_nos = FileManager.load_program(file_path)
+        postings, trigrams = TokenIndex.tokenize(lines)
+        file_id = self.conn.execute("INSERT INTO files (Gr, member, path, mtime, size) VALUES (?, ?, ?, ?, ?)",
+                                    (Gr, member_name, file_path, stat.st_mtime_ns, stat.st_size)).lastrowid
+        self.conn.executemany("INSERT INTO postings VALUES (?, ?, ?)",
+                              [(self.get_token_id(token), file_id, array.array("I", nos).tobytes())
+                               for token, nos in postings.items()])
+        self.conn.executemany("INSERT INTO trigrams VALUES (?, ?)", [(trigram, file_id) for trigram in trigrams])
+
+    def update(self, groups=None):
+        """
+        index the new and modified members of the groups, files are compared by mtime and size
+        :return: number of files indexed again, number of files removed
+        """
+        indexed = removed = 0
+        for Gr in groups or list(self.member_dict):
+            Gr = str(Gr)
+            known = {path: (file_id, mtime, size) for file_id, path, mtime, size in self.conn.execute(
+                "SELECT file_id, path, mtime, size FROM files WHERE Gr=?", (Gr,))}
+            members = dict(self.member_dict[Gr])
+            current = set(members.values())
+            for file_path, (file_id, mtime, size) in known.items():
+                if file_path not in current:
+                    self.remove_file(file_id)
+                    removed += 1
+            for member_name, file_path in members.items():
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                entry = known.get(file_path)
+                if entry and entry[1:] == (stat.st_mtime_ns, stat.st_size):
+                    continue
+                try:
+                    self.index_file(Gr, member_name, file_path, stat)
+                except Exception:
+                    logger.error("Failed to index member: %s", file_path, exc_info=True)
+                    continue
+                indexed += 1
+                if indexed % 100 == 0:
+                    self.conn.commit()
+        self.conn.commit()
+        logger.info("Token index updated: %d files indexed, %d removed", indexed, removed)
+        return indexed, removed
+
+    def get_candidates(self, pattern):
+        """
+        files and lines which may match pattern, a superset of the real hits
+        every identifier part of the literals of the pattern is in a token of the matched line,
+        the other literals narrow the files by their trigrams
+        :return: {file_id: {line No.} or None for every line}, None when the pattern cannot be narrowed
+        """
+        literals = FileManager.get_literals(pattern)
+        parts = {part for literal in literals for part in TOKEN_PATTERN.findall(literal)
+                 if TokenIndex.is_identifier(part)}
+        candidates = None
+        for part in sorted(parts, key=len, reverse=True):
+            hits = collections.defaultdict(set)
+            for file_id, lines in self.conn.execute(
+                    "SELECT p.file_id, p.lines FROM vocabulary v JOIN postings p ON v.token_id = p.token_id "
+                    "WHERE instr(v.token, ?) > 0", (part,)):
+                hits[file_id].update(array.array("I", lines))
+            if candidates is None:
+                candidates = hits
+            else:
+                candidates = {file_id: candidates[file_id] & lines for file_id, lines in hits.items()
+                              if file_id in candidates and candidates[file_id] & lines}
+        if candidates is not None:
+            return candidates
+        trigrams = {literal[i:i + 3] for literal in literals for i in range(len(literal) - 2)}
+        if not trigrams:
+            return None
+        file_ids = None
+        for trigram in trigrams:
+            found = {file_id for file_id, in self.conn.execute("SELECT file_id FROM trigrams WHERE trigram=?",
+                                                               (trigram,))}
+            file_ids = found if file_ids is None else file_ids & found
+        return {file_id: None for file_id in file_ids}
+
+    def search(self, pattern, groups=None):
+        """
+        the candidate lines are searched with the pattern in the preprocessed members
+        :return: [(Gr, member_name, file_path, [line No.])] of the members matching pattern
+        """
+        regex = re.compile(pattern)
+        candidates = self.get_candidates(pattern)
+        groups = {str(Gr) for Gr in groups} if groups else None
+        results = []
+        for file_id, Gr, member_name, file_path in self.conn.execute(
+                "SELECT file_id, Gr, member, path FROM files ORDER BY Gr, member"):
+            if groups and Gr not in groups or candidates is not None and file_id not in candidates:
+                continue
+            lines, line_nos = FileManager.load_program(file_path)
+            nos = candidates[file_id] if candidates is not None and candidates[file_id] is not None \
+                else range(len(lines))
+            idxs = [No for No in sorted(nos) if No < len(lines) and regex.search(lines[No])]
+            if idxs:
+                results.append((Gr, member_name, file_path, idxs))
+        logger.info("Pattern %s: %d candidate files, %d members matched", pattern,
+                    len(candidates) if candidates is not None else -1, len(results))
+        return results
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Update the token index and search a pattern in the members")
+    parser.add_argument("--mapping", required=True,
+                        help="JSON file of mapping_dict, {Gr: folder of the group's members}")
+    parser.add_argument("--cache-dir", default=".analyze_cache")
+    parser.add_argument("--groups", nargs="+", help="groups to index and search, all groups when not given")
+    parser.add_argument("--pattern", help="regular expression searched in every line")
+    args = parser.parse_args(argv)
+    with open(args.mapping, 'r', encoding='utf-8') as f:
+        mapping_dict = {str(Gr): folder for Gr, folder in json.load(f).items()}
+    member_dict = MemberIndex(mapping_dict, args.cache_dir)
+    member_dict.load()
+    token_index = TokenIndex(args.cache_dir, member_dict)
+    print("files indexed: %d, removed: %d" % token_index.update(args.groups))
+    member_dict.save()
+    if args.pattern:
+        for Gr, member_name, file_path, idxs in token_index.search(args.pattern, args.groups):
+            print(Gr, member_name, file_path, idxs)
+    token_index.close()
+
+
+if __name__ == "__main__":
+    main()